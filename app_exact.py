@@ -2,8 +2,13 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import pandas as pd
+import numpy as np
 from pathlib import Path
-import os, re, csv, zipfile, sys, importlib
+import os, re, zipfile, sys, importlib, threading, queue, time
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from datetime import datetime, timedelta, timezone
 from PIL import Image, ImageTk
 
 try:
@@ -15,66 +20,155 @@ try:
 except Exception:
     xlrd = None
 
-from db_helper import ensure_db, upsert_many_batched, replace_all, query
+from db_helper import (ensure_db, query, import_rows, list_versions, query_as_of, version_at,
+                       query_page, count_rows, watch_index, TABLE_COLS)
+from chunk_export import export_text_xlsx, export_chunks, existing_outputs, chunk_paths
+from codebook_server import remote_page, remote_count
+from parse_cache import file_digest, cache_get, cache_put, clear as clear_parse_cache
+from folder_watch import FolderWatcher, mark_existing
 
 APP_DIR = Path(__file__).parent
 DB_PATH = str(APP_DIR / "codebook.db")
+CACHE_DIR = str(APP_DIR / "cache")
+# 配置后行号选择改走共享查询服务（codebook_server.py），如 http://192.168.1.10:8765
+CODEBOOK_URL = os.environ.get("HX_CODEBOOK_URL", "").strip().rstrip("/")
+# 配置后启动即监视该文件夹，新增/变更的行号文件自动增量导入（也可在库维护页手动开启）
+WATCH_DIR = os.environ.get("HX_WATCH_DIR", "").strip()
+# 首次监视时默认把文件夹中已有文件记为基线不导入；设为 1 则现有文件也按修改时间依次导入
+WATCH_IMPORT_EXISTING = os.environ.get("HX_WATCH_IMPORT_EXISTING", "").strip() == "1"
+# 解析逻辑（read_any / pick_*）有变化时递增，旧缓存自动失效
+PARSER_VERSION = "2"
 
 COMMON_ENCODINGS = ["utf-8-sig","utf-8","gbk","gb18030","utf-16","utf-16le","utf-16be","latin1"]
 COMMON_DELIMS = ["|","\t",",",";"," "]
+DELIM_LABELS = {"|":"竖线 |", "\t":"制表符", ",":"逗号 ,", ";":"分号 ;", r"\s+":"空白"}
 
-def sniff_delimiter(text: str):
-    try:
-        dialect = csv.Sniffer().sniff(text, delimiters="|\t,; ")
-        return dialect.delimiter
-    except Exception:
-        first = next((ln for ln in text.splitlines() if ln.strip()), "")
-        best, bestn = None, 1
-        for d in COMMON_DELIMS:
-            n = len([c for c in first.split(d) if c != ""])
-            if n > bestn:
-                best, bestn = d, n
-        return best or ","
+# ---------------- TXT 编码/分隔符探测（抽样） ----------------
+TXT_SAMPLE_BLOCK = 64 * 1024
+_BOMS = [(b"\xef\xbb\xbf", "utf-8-sig"), (b"\xff\xfe", "utf-16"), (b"\xfe\xff", "utf-16")]
+# 无 BOM 的 8 位编码候选及其置信度（按原 COMMON_ENCODINGS 的优先顺序）
+_ENC_CANDIDATES = [("utf-8", 0.95), ("gbk", 0.8), ("gb18030", 0.7), ("latin1", 0.3)]
+
+def _sample_blocks(data: bytes, block: int = TXT_SAMPLE_BLOCK):
+    # 取头/中/尾三段，按换行对齐，避免截断多字节字符；采样量与文件大小无关
+    n = len(data)
+    if n <= block * 3:
+        return [data]
+    mid = (n - block) // 2
+    head, middle, tail = data[:block], data[mid:mid+block], data[n-block:]
+    def after_nl(b):
+        i = b.find(b"\n"); return b[i+1:] if i >= 0 else b""
+    def before_nl(b):
+        i = b.rfind(b"\n"); return b[:i+1] if i >= 0 else b""
+    return [before_nl(head), before_nl(after_nl(middle)), after_nl(tail)]
+
+def _guess_utf16(head: bytes):
+    if len(head) < 4:
+        return None
+    even = head[0::2].count(0); odd = head[1::2].count(0)
+    half = len(head) // 2
+    if odd > half * 0.3 and even < half * 0.05: return "utf-16le"
+    if even > half * 0.3 and odd < half * 0.05: return "utf-16be"
+    return None
+
+def detect_encoding(data: bytes):
+    for bom, enc in _BOMS:
+        if data.startswith(bom):
+            return enc, 1.0
+    blocks = _sample_blocks(data)
+    enc16 = _guess_utf16(blocks[0][:4096])
+    if enc16:
+        return enc16, 0.9
+    if all(b.isascii() for b in blocks):
+        return "utf-8", 1.0
+    for enc, conf in _ENC_CANDIDATES:
+        try:
+            for b in blocks: b.decode(enc)
+        except UnicodeDecodeError:
+            continue
+        return enc, conf
+    return "latin1", 0.3
+
+def _score_delimiter(lines):
+    lines = [ln for ln in lines if ln.strip()][:2000]
+    if not lines:
+        return None, 0.0
+    best, best_score = None, 0.0
+    for d in COMMON_DELIMS:
+        counts = [ln.count(d) for ln in lines]
+        nonzero = [c for c in counts if c > 0]
+        if not nonzero: continue
+        # 各行分隔符个数一致的比例作为得分；空格常出现在行名中，略降权
+        _, freq = Counter(nonzero).most_common(1)[0]
+        score = freq / len(lines) * (0.9 if d == " " else 1.0)
+        if score > best_score:
+            best, best_score = d, score
+    if best == " ":
+        best = r"\s+"
+    return best, round(best_score, 3)
+
+def detect_txt_format(data: bytes):
+    enc, enc_conf = detect_encoding(data)
+    lines = []
+    for b in _sample_blocks(data):
+        lines += b.decode(enc, errors="replace").replace("\r\n","\n").replace("\r","\n").split("\n")
+    delim, delim_conf = _score_delimiter(lines)
+    return {"encoding": enc, "delimiter": delim, "confidence": round(min(enc_conf, delim_conf or 0.0), 3),
+            "encoding_confidence": enc_conf, "delimiter_confidence": delim_conf}
+
+def describe_txt_format(fmt):
+    if not fmt: return ""
+    d = fmt.get("delimiter")
+    return f"编码 {fmt.get('encoding')}，分隔符 {DELIM_LABELS.get(d, d or '无')}，置信度 {fmt.get('confidence', 0):.0%}"
+
+def _decode_once(data: bytes, enc: str):
+    # 正常情况下只完整解码一次；仅当抽样漏掉了非法字节时才依次回退
+    order = [enc] + [e for e in COMMON_ENCODINGS if e != enc]
+    for e in order:
+        try:
+            return data.decode(e), e
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin1"), "latin1"
 
 def try_parse_txt(path: str):
     from io import StringIO
     data = Path(path).read_bytes()
-    for enc in COMMON_ENCODINGS:
-        try:
-            s = data.decode(enc)
-        except Exception:
-            continue
-        s = s.replace("\r\n","\n").replace("\r","\n")
-        if s and s[0] == "\ufeff": s = s[1:]
+    fmt = detect_txt_format(data)
+    s, enc = _decode_once(data, fmt["encoding"])
+    if enc != fmt["encoding"]:
+        fmt.update(encoding=enc, encoding_confidence=0.5, confidence=min(fmt["confidence"], 0.5))
+    s = s.replace("\r\n","\n").replace("\r","\n")
+    if s and s[0] == "\ufeff": s = s[1:]
+    def try_read(sep):
+        sio = StringIO(s)
+        return pd.read_csv(sio, sep=sep, header=None, dtype=str, engine="python",
+                           quoting=3, on_bad_lines="skip", escapechar="\\").dropna(axis=1, how="all").dropna(axis=0, how="all")
+    df = None
+    delim = fmt["delimiter"]
+    for sep in [delim] + [x for x in ["|","\t",",",";",r"\s+"] if x != delim]:
+        if not sep: continue
         try:
-            delim = sniff_delimiter(s)
+            df = try_read(sep)
+            if df is not None and not df.empty:
+                if sep != delim: fmt.update(delimiter=sep, delimiter_confidence=0.5, confidence=min(fmt["confidence"], 0.5))
+                break
         except Exception:
-            delim = None
-        def try_read(sep):
-            sio = StringIO(s)
-            return pd.read_csv(sio, sep=sep, header=None, dtype=str, engine="python",
-                               quoting=3, on_bad_lines="skip", escapechar="\\").dropna(axis=1, how="all").dropna(axis=0, how="all")
-        for sep in [delim, "|","\t",",",";","\s+"]:
-            if not sep: continue
-            try:
-                df = try_read(sep)
-                if df is not None and not df.empty: break
-            except Exception:
-                df = None
-        else:
             df = None
-        if df is not None and df.shape[1] == 1:
-            col = df.columns[0]
-            for sep in ["|","\t",",",";"]:
-                parts = df[col].str.split(sep, expand=True)
-                if parts.shape[1] >= 2: df = parts; break
-            else:
-                parts = df[col].str.split(r"\s+", expand=True)
-                if parts.shape[1] >= 2: df = parts
-        if df is not None and not df.empty: return df
+    if df is not None and df.shape[1] == 1:
+        col = df.columns[0]
+        for sep in ["|","\t",",",";"]:
+            parts = df[col].str.split(sep, expand=True)
+            if parts.shape[1] >= 2: df = parts; break
+        else:
+            parts = df[col].str.split(r"\s+", expand=True)
+            if parts.shape[1] >= 2: df = parts
+    if df is not None and not df.empty:
+        df.attrs["txt_format"] = fmt
+        return df
     raise RuntimeError("无法解析 TXT：请另存为 CSV/Excel 再导入。")
 
-def read_any(path: str):
+def _read_any_uncached(path: str):
     p = Path(path); ext = p.suffix.lower()
     if ext in [".xlsx",".xlsm",".xltx",".xltm"]:
         if not zipfile.is_zipfile(path):
@@ -90,19 +184,27 @@ def read_any(path: str):
         return try_parse_txt(path)
     raise RuntimeError("不支持的文件类型，请转存为 CSV/Excel 后再导入。")
 
-def export_text_xlsx(df: pd.DataFrame, path: str, *, include_header: bool = True):
-    from openpyxl import Workbook
-    wb = Workbook(); ws = wb.active; ws.title="Sheet1"
-    start_row = 1
-    if include_header:
-        for j, col in enumerate(df.columns, start=1):
-            cell = ws.cell(row=1, column=j, value=str(col)); cell.number_format="@"
-        start_row = 2
-    for i, (_, row) in enumerate(df.iterrows(), start=start_row):
-        for j, col in enumerate(df.columns, start=1):
-            val = "" if pd.isna(row[col]) else str(row[col])
-            cell = ws.cell(row=i, column=j, value=val); cell.number_format="@"
-    wb.save(path)
+# ---------------- 解析缓存（按文件内容哈希） ----------------
+def _digest_or_none(path: str):
+    try:
+        return file_digest(path)
+    except OSError:
+        return None
+
+def _cached_stage(digest, stage: str, build):
+    if digest:
+        df = cache_get(CACHE_DIR, digest, stage, PARSER_VERSION)
+        if df is not None:
+            return df
+    df = build()
+    if digest:
+        cache_put(CACHE_DIR, digest, stage, PARSER_VERSION, df)
+    return df
+
+def read_any(path: str, use_cache: bool = True):
+    ext = Path(path).suffix.lower().lstrip(".")
+    digest = _digest_or_none(path) if use_cache else None
+    return _cached_stage(digest, f"read-{ext}", lambda: _read_any_uncached(path))
 
 # ---------------- 背景水印 ----------------
 def _install_watermark(frame, img_path, opacity=0.08):
@@ -221,6 +323,198 @@ def pick_cnaps(df):
     use = use[(use["BNKCODE"]!="") & (use["LNAME"]!="")].drop_duplicates(subset=["BNKCODE"]).reset_index(drop=True)
     return use
 
+# 读取并抽取 ibps/cnaps 字段；同一内容再次导入时直接命中缓存，跳过解码与解析
+def read_and_pick(path: str, table: str, use_cache: bool = True):
+    picker = pick_cnaps if table == "cnaps" else pick_ibps
+    ext = Path(path).suffix.lower().lstrip(".")
+    digest = _digest_or_none(path) if use_cache else None
+    def build():
+        df = _cached_stage(digest, f"read-{ext}", lambda: _read_any_uncached(path))
+        use = picker(df)
+        use.attrs.update(df.attrs)
+        return use
+    return _cached_stage(digest, f"pick-{table}-{ext}", build)
+
+def codebook_rows(use, table: str, source: str):
+    # pick_* 结果转为 import_rows 的行：(*TABLE_COLS[table], raw_line, source)
+    rows = []
+    if table=="cnaps":
+        for _, r in use.iterrows():
+            code = r.get("BNKCODE",""); name = r.get("LNAME","")
+            if re.fullmatch(r"\d{12}", str(code) or ""):
+                cls, city = ["" if pd.isna(r.get(c)) else str(r.get(c)) for c in ["CLSCODE","CITYCODE"]]
+                raw = "|".join([str(code), cls, city, str(name)])
+                rows.append((str(code), str(name), cls, city, raw, source))
+    else:
+        for _, r in use.iterrows():
+            code = r.get("code",""); name = r.get("name","")
+            if re.fullmatch(r"\d{12}", str(code) or ""):
+                raw = "|".join([str(r.get(c,"")) for c in ["code","name"]])
+                rows.append((str(code), str(name), raw, source))
+    return rows
+
+def guess_codebook_table(path: str):
+    # 监视文件夹无人选择库：先看文件名，再看表头/列数，单列文本取有效行号更多的一种
+    name = os.path.basename(path).lower()
+    if "cnaps" in name or "大额" in name: return "cnaps"
+    if "ibps" in name or "清算" in name: return "ibps"
+    df = read_any(path)
+    cols = "".join(str(c) for c in df.columns)
+    if "BNKCODE" in cols: return "cnaps"
+    if _locate_header_row_for_ibps(df) is not None or ("行号" in cols and "名称" in cols): return "ibps"
+    if df.shape[1] == 1:
+        def valid_rows(table):
+            try:
+                return len(read_and_pick(path, table))
+            except Exception:
+                return 0  # 如 pick_ibps 要求至少两列，单列文本直接报错
+        counts = {t: valid_rows(t) for t in ("cnaps", "ibps")}
+        return max(counts, key=counts.get)
+    return "cnaps" if df.shape[1] >= 4 else "ibps"
+
+def import_codebook_file(path: str, table: str = None):
+    # 监视文件夹自动导入：一律按 code 增量合并，不做全量替换
+    table = table or guess_codebook_table(path)
+    source = os.path.basename(path)
+    rows = codebook_rows(read_and_pick(path, table), table, source)
+    if not rows:
+        raise RuntimeError("未发现有效的12位行号记录")
+    return table, import_rows(DB_PATH, table, rows, replace=False, source=source)
+
+# ---------------- 批次校验：重复收款人 / 分组控制总额 ----------------
+_PLAIN_AMOUNT = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)")
+
+def _to_decimal(s):
+    try:
+        d = Decimal(str(s).strip().replace(",", ""))
+    except (InvalidOperation, ValueError):
+        return None
+    return d if d.is_finite() else None
+
+def _plain_amount(s: str):
+    # 统一为不带指数/千分位的十进制字符串；无法解析返回 None
+    if _PLAIN_AMOUNT.fullmatch(s): return s
+    d = _to_decimal(s)
+    return format(d, "f") if d is not None else None
+
+def _stripped(df, col):
+    return df[col].fillna("").astype(str).str.strip().reset_index(drop=True)
+
+_AMOUNT_CHARS = "0123456789.+-"
+
+def _amount_units(raw):
+    # 金额按批次内最大小数位 exp 换算为整数：每个不同写法只解析一次，再按 factorize 编码展开到各行。
+    # 常见的纯数字写法走 numpy：整数位+exp 不超过 15 位时 float 乘 10**exp 后取整是精确的；否则逐个 int()
+    codes, uniq = pd.factorize(raw)
+    uniq = np.asarray(uniq, dtype=object)
+    simple = np.array([not u.strip(_AMOUNT_CHARS) for u in uniq], dtype=bool)
+    nums = np.full(len(uniq), np.nan)
+    if simple.any():
+        try:
+            nums[simple] = uniq[simple].astype(float)
+        except ValueError:  # 如 "1-2"、"."：逐个判定
+            nums[simple] = pd.to_numeric(pd.Series(uniq[simple]), errors="coerce").to_numpy(dtype=float)
+    plain = np.isfinite(nums)
+    text = uniq.copy()
+    ok = plain.copy()
+    for j in np.flatnonzero(~plain):  # 千分位、指数、全角等少数写法
+        text[j] = _plain_amount(text[j]); ok[j] = text[j] is not None
+    dot = np.array([t.find(".") if t is not None else -1 for t in text])
+    size = np.array([len(t) if t is not None else 0 for t in text])
+    frac = np.where(dot >= 0, size - dot - 1, 0)
+    exp = int(frac[ok].max()) if ok.any() else 0
+    int_len = np.where(dot >= 0, dot, size)
+    exact = lambda t, f: int(t.replace(".", "") + "0" * (exp - f))
+    if not plain.any() or int_len[plain].max() + exp <= 15:
+        table = np.rint(np.where(plain, nums, 0) * 10.0 ** exp).astype(np.int64)
+        odd = {j: exact(text[j], frac[j]) for j in np.flatnonzero(ok & ~plain)}  # 非常规写法逐个精确换算
+    else:
+        table = np.zeros(len(text), dtype=np.int64)
+        odd = {j: exact(text[j], frac[j]) for j in np.flatnonzero(ok)}
+    biggest = max(int(np.abs(table).max()) if len(table) else 0, max(map(abs, odd.values()), default=0))
+    if biggest * max(len(raw), 1) >= 2**62:
+        table = table.astype(object)  # 单笔或合计可能超出 int64 时改用 Python 整数
+    for j, v in odd.items(): table[j] = v
+    ok = np.append(ok, False)  # 末位对应 factorize 的缺失编码 -1
+    table = np.append(table, 0).astype(table.dtype)
+    valid = pd.Series(ok[codes], index=raw.index)
+    units = pd.Series(table[codes], index=raw.index)[valid]
+    return units, valid, exp
+
+def _group_rows(keys, rows):
+    # keys 与 rows 一一对应；返回 {key: [行号]}，组按首次出现的顺序
+    codes, uniq = pd.factorize(keys)
+    if not len(codes): return {}
+    order = np.argsort(codes, kind="stable")
+    sc = codes[order]
+    starts = np.flatnonzero(np.r_[True, sc[1:] != sc[:-1]])
+    ends = np.r_[starts[1:], len(sc)].tolist()
+    rs = rows[order].tolist()
+    return {k: rs[s:e] for k, s, e in zip(uniq[sc[starts]].tolist(), starts.tolist(), ends)}
+
+def batch_check(df, acct_col: str, amt_col: str, group_cols=()):
+    # 账号 / 账号+金额 借助 pandas 哈希表一遍找出重复；
+    # 金额按批次内最大小数位换算为整数后汇总，避免浮点误差，结果与逐笔 Decimal 相加一致
+    n = len(df)
+    acct, raw = _stripped(df, acct_col), _stripped(df, amt_col)
+    units, valid, exp = _amount_units(raw)
+    def to_dec(v):
+        v = int(v)
+        return Decimal((int(v < 0), tuple(int(c) for c in str(abs(v))), -exp))  # 按位构造，不受上下文精度截断
+    has_acct = acct.ne("").to_numpy()
+    m = has_acct & acct.duplicated(keep=False).to_numpy()
+    dup_acct = _group_rows(acct.to_numpy()[m], np.flatnonzero(m))
+    dup_pair = {}
+    pair_rows = np.flatnonzero(valid.to_numpy() & m)  # 同账号同金额必然同账号重复，只在这些行里找
+    if len(pair_rows):
+        a_codes, a_uniq = pd.factorize(acct.to_numpy()[pair_rows])
+        u_codes, u_uniq = pd.factorize(units[pair_rows].to_numpy())
+        key = pd.Series(a_codes.astype("int64") * (len(u_uniq) + 1) + u_codes)
+        m2 = key.duplicated(keep=False).to_numpy()
+        for k, rows in _group_rows(key.to_numpy()[m2], pair_rows[m2]).items():
+            dup_pair[(a_uniq[k // (len(u_uniq) + 1)], to_dec(u_uniq[k % (len(u_uniq) + 1)]))] = rows
+    totals = {}
+    for c in group_cols:
+        g = _stripped(df, c)
+        counts = g.value_counts(sort=False)
+        sums = units.groupby(g[valid]).sum() if len(units) else {}
+        totals[c] = {k: (int(cnt), to_dec(sums.get(k, 0))) for k, cnt in counts.items()}
+    return {"count": n, "sum": to_dec(units.sum()) if len(units) else Decimal(0), "bad_amount": int((~valid).sum()),
+            "dup_account": dup_acct, "dup_account_amount": dup_pair, "totals": totals}
+
+def _rows_text(idxs, limit=5):
+    s = "、".join(str(i+1) for i in idxs[:limit])
+    return f"第{s}{'…' if len(idxs) > limit else ''}行"
+
+def batch_warnings(report, limit: int = 10):
+    probs = []
+    pairs = report["dup_account_amount"]
+    if pairs:
+        items = [f"{a}/{format(m, 'f')}（{_rows_text(rows)}）" for (a, m), rows in list(pairs.items())[:limit]]
+        probs.append(f"存在 {len(pairs)} 组 同账号同金额 重复：" + "，".join(items) + ("…" if len(pairs) > limit else ""))
+    # 账号的行全部落在同金额组里时不再重复提示；还有其他行（如第三笔不同金额）则列出该账号全部行
+    covered = Counter()
+    for (a, _), rows in pairs.items(): covered[a] += len(rows)
+    accts = {a: rows for a, rows in report["dup_account"].items() if len(rows) > covered[a]}
+    if accts:
+        items = [f"{a}（{_rows_text(rows)}）" for a, rows in list(accts.items())[:limit]]
+        probs.append(f"存在 {len(accts)} 个 账号重复出现：" + "，".join(items) + ("…" if len(accts) > limit else ""))
+    return probs
+
+def batch_summary(report, labels=None, limit: int = 20):
+    labels = labels or {}
+    lines = [f"合计：{report['count']} 笔，金额 {report['sum']:,f}"]
+    if report["bad_amount"]:
+        lines[0] += f"（{report['bad_amount']} 笔金额无法解析，未计入）"
+    for col, g in report["totals"].items():
+        lines.append(f"— {labels.get(col, col)}：")
+        ranked = sorted(g.items(), key=lambda kv: (-kv[1][0], kv[0]))
+        for k, (n, s) in ranked[:limit]:
+            lines.append(f"    {k or '（空）'}：{n} 笔，{s:,f}")
+        if len(ranked) > limit:
+            lines.append(f"    … 其余 {len(ranked) - limit} 组")
+    return "\n".join(lines)
+
 # ---------------- UI 复用组件 ----------------
 class ScrollableTree(ttk.Frame):
     def __init__(self, master, **kwargs):
@@ -228,7 +522,12 @@ class ScrollableTree(ttk.Frame):
         self.tree = ttk.Treeview(self, show="headings", **kwargs)
         xbar = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
         ybar = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
-        self.tree.configure(xscrollcommand=xbar.set, yscrollcommand=ybar.set)
+        self.on_scroll_end = None  # 滚动到底部时回调（分页加载用）
+        def yscroll(first, last):
+            ybar.set(first, last)
+            if self.on_scroll_end and float(last) >= 1.0:
+                self.after_idle(self.on_scroll_end)
+        self.tree.configure(xscrollcommand=xbar.set, yscrollcommand=yscroll)
         self.tree.grid(row=0, column=0, sticky="nsew")
         ybar.grid(row=0, column=1, sticky="ns")
         xbar.grid(row=1, column=0, sticky="ew")
@@ -266,6 +565,200 @@ def center_and_autosize(win, min_w=760, min_h=420, pad=24):
     win.minsize(req_w, req_h)
     win.geometry(f"{req_w}x{req_h}+{x}+{y}")
 
+CNAPS_FILTERS = [("citycode","城市代码"), ("clscode","清算行号")]
+
+def build_cnaps_filters(parent, on_enter):
+    fvars = {}
+    ttk.Label(parent, text="CNAPS 过滤：").pack(side="left")
+    for col, label in CNAPS_FILTERS:
+        ttk.Label(parent, text=label + "：").pack(side="left", padx=(8,0))
+        var = tk.StringVar(); ent = ttk.Entry(parent, textvariable=var, width=14); ent.pack(side="left")
+        ent.bind("<Return>", lambda e: on_enter())
+        fvars[col] = var
+    ttk.Label(parent, text="（前缀匹配，仅对 CNAPS 生效）", foreground="#666").pack(side="left", padx=8)
+    return fvars
+
+REMOTE_TIMEOUT = 1.5
+REMOTE_RETRY_AFTER = 60  # 服务调用失败后这段时间内直接走本地库，避免每次查询/滚动都卡在超时上
+_remote_down_until = 0.0
+
+def _try_remote(fn, *args):
+    global _remote_down_until
+    if not CODEBOOK_URL or time.monotonic() < _remote_down_until:
+        return None
+    try:
+        return fn(CODEBOOK_URL, *args, timeout=REMOTE_TIMEOUT)
+    except Exception:
+        _remote_down_until = time.monotonic() + REMOTE_RETRY_AFTER
+        return None
+
+def codebook_page(table, keyword, after=None, page_size=500, filters=None):
+    res = _try_remote(remote_page, table, keyword, after, page_size, filters)
+    return res if res is not None else query_page(DB_PATH, table, keyword, after, page_size, filters)
+
+def codebook_count(table, keyword, filters=None):
+    res = _try_remote(remote_count, table, keyword, filters)
+    return res if res is not None else count_rows(DB_PATH, table, keyword, filters)
+
+def local_page(table, keyword, after=None, page_size=500, filters=None):
+    return query_page(DB_PATH, table, keyword, after, page_size, filters)
+
+def local_count(table, keyword, filters=None):
+    return count_rows(DB_PATH, table, keyword, filters)
+
+class TreePager:
+    # 行号列表分页加载：先显示首页与总数，滚动到底部时按 (name, code) keyset 取下一页
+    # page_fn/count_fn 默认可走共享查询服务；库维护页传本地库版本，保证看到的是刚导入的数据
+    def __init__(self, stree, status_var, page_size=500, page_fn=codebook_page, count_fn=codebook_count):
+        self.stree = stree; self.status = status_var; self.page_size = page_size
+        self.page_fn = page_fn; self.count_fn = count_fn
+        self.args = None; self.next = None; self.loaded = 0; self.total = ""
+        self._busy = False
+        stree.on_scroll_end = self.more
+
+    def start(self, table, keyword, filters=None, columns=("code","name")):
+        self.args = (table, keyword, filters)
+        self.idx = [TABLE_COLS[table].index(c) for c in columns]
+        tree = self.stree.tree; tree.delete(*tree.get_children())
+        self.next = None; self.loaded = 0
+        n, exact = self.count_fn(table, keyword, filters)
+        self.total = f"{n}" if exact else f"{n}+"
+        self.more(first=True)
+
+    def stop(self):
+        self.args = None
+
+    def more(self, first=False):
+        if self.args is None or self._busy or (not first and self.next is None):
+            return
+        if not self.stree.winfo_exists():  # 弹窗已关闭
+            return
+        self._busy = True
+        try:
+            table, keyword, filters = self.args
+            rows, self.next = self.page_fn(table, keyword, self.next, self.page_size, filters)
+            tree = self.stree.tree
+            for r in rows:
+                tree.insert("", "end", values=[r[i] for i in self.idx])
+            self.loaded += len(rows)
+        finally:
+            self._busy = False
+        tip = "（滚动到底部加载更多）" if self.next else ""
+        self.status.set(f"显示前 {self.loaded} 条 / 共 {self.total} 条{tip}")
+
+# ---------------- 明细表格：排序 / 筛选 ----------------
+class GridView:
+    # 行只插入一次（iid = 行号），排序、筛选都只用一次 set_children 重排/隐藏，不重建行
+    def __init__(self, tree, numeric_cols=()):
+        self.tree = tree; self.numeric_cols = set(numeric_cols)
+        self.df = None; self.invalid_mask = None; self._n = 0
+        self.sort_col = None; self.desc = False
+        self.text = tk.StringVar(); self.invalid_only = tk.BooleanVar(value=False)
+        self.status = tk.StringVar()
+        self._keys = {}; self._orders = {}; self._hay = None; self._last = ("", None); self._pending = None
+        self.text.trace_add("write", lambda *a: self._schedule())
+
+    def build_toolbar(self, parent):
+        ttk.Label(parent, text="筛选：").pack(side="left")
+        ttk.Entry(parent, textvariable=self.text, width=28).pack(side="left")
+        ttk.Checkbutton(parent, text="仅显示问题行", variable=self.invalid_only, command=self.apply).pack(side="left", padx=8)
+        ttk.Label(parent, textvariable=self.status, foreground="#666").pack(side="left", padx=8)
+
+    def bind(self, df, invalid_mask=None):
+        # 数据变化后调用（_reload 之后），丢弃按列缓存的排序键与筛选文本
+        self.df = df; self.invalid_mask = invalid_mask; self._n = len(df)
+        self._keys = {}; self._orders = {}; self._hay = None; self._last = ("", None)
+        for col in df.columns:
+            self.tree.heading(col, command=lambda c=col: self.sort_by(c))
+        self.apply()
+        self.tree.after_idle(lambda: self._warm(df, list(df.columns)))
+
+    def clear(self):
+        # 筛选隐藏的行只是 detach，get_children 取不到，需按 iid 全部删除
+        self.tree.delete(*[str(i) for i in range(self._n)]); self._n = 0
+
+    def sort_by(self, col):
+        if self.df is None: return
+        self.desc = (not self.desc) if col == self.sort_col else False
+        self.sort_col = col
+        self.apply()
+
+    def _key(self, col):
+        key = self._keys.get(col)
+        if key is None:
+            s = self.df[col]
+            if col in self.numeric_cols:
+                key = pd.to_numeric(s, errors="coerce").to_numpy(dtype=float)
+            else:
+                key, _ = pd.factorize(s.fillna("").astype(str), sort=True)
+            self._keys[col] = key
+        return key
+
+    def _order(self, col, desc):
+        order = self._orders.get((col, desc))
+        if order is None:
+            key = self._key(col)
+            if col in self.numeric_cols:
+                key = np.where(np.isnan(key), np.inf, -key if desc else key)  # 非数字始终排在最后
+            elif desc:
+                key = -key
+            order = self._orders[(col, desc)] = np.argsort(key, kind="stable")
+        return order
+
+    def _warm(self, token, cols):
+        # 数据载入后利用空闲时间逐列预计算排序键和筛选文本，首次点击表头/输入筛选也能即时响应
+        if token is not self.df or not self.tree.winfo_exists(): return
+        if self._hay is None:
+            self._build_hay()
+        elif cols:
+            self._order(cols[0], False); cols = cols[1:]
+        else:
+            return
+        self.tree.after_idle(lambda: self._warm(token, cols))
+
+    def _build_hay(self):
+        df = self.df.fillna("").astype(str)
+        hay = df.iloc[:, 0] if len(df.columns) else pd.Series([], dtype=object)
+        for c in df.columns[1:]:
+            hay = hay + "\x1f" + df[c]
+        self._hay = hay.str.lower().tolist()
+
+    def _matches(self, needle):
+        if self._hay is None:
+            self._build_hay()
+        prev, prev_idx = self._last
+        # 输入在上次基础上追加字符时，只在上次命中的行里继续筛
+        cand = prev_idx if (prev_idx is not None and prev and needle.startswith(prev)) else range(len(self._hay))
+        hay = self._hay
+        idx = [i for i in cand if needle in hay[i]]
+        self._last = (needle, idx)
+        mask = np.zeros(len(hay), dtype=bool); mask[idx] = True
+        return mask
+
+    def _schedule(self):
+        if self._pending: self.tree.after_cancel(self._pending)
+        self._pending = self.tree.after(120, self.apply)
+
+    def apply(self):
+        self._pending = None
+        if self.df is None: return
+        n = len(self.df)
+        order = self._order(self.sort_col, self.desc) if self.sort_col in self.df.columns else np.arange(n)
+        keep = None
+        if self.invalid_only.get() and self.invalid_mask is not None:
+            keep = np.asarray(self.invalid_mask, dtype=bool)
+        needle = self.text.get().strip().lower()
+        if needle:
+            m = self._matches(needle)
+            keep = m if keep is None else (keep & m)
+        if keep is not None:
+            order = order[keep[order]]
+        self.tree.set_children("", *[str(i) for i in order])
+        for col in self.df.columns:
+            arrow = ("▼" if self.desc else "▲") if col == self.sort_col else ""
+            self.tree.heading(col, text=col + arrow)
+        self.status.set(f"显示 {len(order)} / 共 {n} 行")
+
 # ---------------- 选择行号弹窗 ----------------
 class CodePicker(tk.Toplevel):
     def __init__(self, master, default_source="ibps", ibps_only=False):
@@ -288,6 +781,10 @@ class CodePicker(tk.Toplevel):
         ttk.Label(top, text="关键字：").pack(side="left", padx=8)
         ent = ttk.Entry(top, textvariable=self.kw, width=32); ent.pack(side="left"); ent.bind("<Return>", lambda e: self.search())
         ttk.Button(top, text="查询", command=self.search).pack(side="left", padx=6)
+        self.filters = {}
+        if not ibps_only:
+            flt = ttk.Frame(self, padding=(8,0)); flt.pack(fill="x")
+            self.filters = build_cnaps_filters(flt, self.search)
 
         self.stree = ScrollableTree(self, height=18); self.stree.pack(fill="both", expand=True, padx=8, pady=6)
         tree = self.stree.tree; tree["columns"] = ["code","name"]
@@ -296,16 +793,18 @@ class CodePicker(tk.Toplevel):
         tree.bind("<Double-1>", lambda e: self.pick()); tree.bind("<Return>", lambda e: self.pick())
 
         btns = ttk.Frame(self, padding=8); btns.pack(fill="x")
+        self.status = tk.StringVar()
+        ttk.Label(btns, textvariable=self.status, foreground="#666").pack(side="left")
         ttk.Button(btns, text="确定", command=self.pick).pack(side="right", padx=6)
         ttk.Button(btns, text="取消", command=self.destroy).pack(side="right")
+        self.pager = TreePager(self.stree, self.status)
 
         self.after(10, lambda: (self.search(), center_and_autosize(self, 760, 520)))
 
     def search(self):
-        rows = query(DB_PATH, self.source.get(), self.kw.get().strip(), limit=5000)
-        tree = self.stree.tree; tree.delete(*tree.get_children())
-        for r in rows:
-            tree.insert("", "end", values=[r["code"], r["name"]])
+        table = self.source.get()
+        filters = {c: v.get() for c, v in self.filters.items()} if table == "cnaps" else None
+        self.pager.start(table, self.kw.get().strip(), filters)
 
     def pick(self):
         tree = self.stree.tree; sel = tree.selection()
@@ -320,20 +819,41 @@ class LibraryTab(ttk.Frame):
         super().__init__(master)
         self.table_choice = tk.StringVar(value="ibps")
         self.kw = tk.StringVar()
+        self.version_choice = tk.StringVar(value="当前")
         self._build()
 
     def _build(self):
         top = ttk.Frame(self); top.pack(fill="x", padx=8, pady=8)
         ttk.Label(top, text="维护库：").pack(side="left")
-        ttk.Radiobutton(top, text="IBPS（清算）", variable=self.table_choice, value="ibps").pack(side="left")
-        ttk.Radiobutton(top, text="CNAPS（大额）", variable=self.table_choice, value="cnaps").pack(side="left", padx=8)
+        ttk.Radiobutton(top, text="IBPS（清算）", variable=self.table_choice, value="ibps", command=self._refresh_versions).pack(side="left")
+        ttk.Radiobutton(top, text="CNAPS（大额）", variable=self.table_choice, value="cnaps", command=self._refresh_versions).pack(side="left", padx=8)
         ttk.Button(top, text="导入行号", command=self.import_file).pack(side="left", padx=12)
         ttk.Button(top, text="导出库", command=self.export_db).pack(side="left", padx=12)
+        self.watch_btn = ttk.Button(top, text="监视文件夹…", command=self.toggle_watch); self.watch_btn.pack(side="left")
         ttk.Label(top, text="关键词：").pack(side="left", padx=12)
         ttk.Entry(top, textvariable=self.kw, width=28).pack(side="left")
         ttk.Button(top, text="查询", command=self.search).pack(side="left", padx=6)
+        ttk.Label(top, text="版本：").pack(side="left", padx=(12,0))
+        self.version_box = ttk.Combobox(top, textvariable=self.version_choice, state="readonly", width=40)
+        self.version_box.pack(side="left"); self.version_box.bind("<<ComboboxSelected>>", lambda e: self.search())
+        flt = ttk.Frame(self); flt.pack(fill="x", padx=8)
+        self.filters = build_cnaps_filters(flt, self.search)
+        self.as_of = tk.StringVar()
+        ttk.Button(flt, text="定位版本", command=self.jump_to_date).pack(side="right")
+        ent = ttk.Entry(flt, textvariable=self.as_of, width=12); ent.pack(side="right", padx=4)
+        ent.bind("<Return>", lambda e: self.jump_to_date())
+        ttk.Label(flt, text="截至日期（YYYY-MM-DD）：").pack(side="right")
 
         self.stree = ScrollableTree(self); self.stree.pack(fill="both", expand=True, padx=8, pady=6)
+        self.status = tk.StringVar()
+        ttk.Label(self, textvariable=self.status, foreground="#666").pack(anchor="w", padx=8, pady=(0,6))
+        self.pager = TreePager(self.stree, self.status, page_fn=local_page, count_fn=local_count)
+        self.watch_status = tk.StringVar()
+        ttk.Label(self, textvariable=self.watch_status, foreground="#666").pack(anchor="w", padx=8, pady=(0,6))
+        self.watcher = None
+        self.after(10, self._refresh_versions)
+        if WATCH_DIR and os.path.isdir(WATCH_DIR):
+            self.after(500, self._auto_watch)
         # 背景
         try:
             _install_watermark(self, str(APP_DIR / "bg.jpg"), opacity=0.08)
@@ -343,44 +863,125 @@ class LibraryTab(ttk.Frame):
     def import_file(self):
         path = filedialog.askopenfilename(filetypes=[("TXT/Excel/CSV","*.txt;*.dat;*.xls;*.xlsx;*.csv"),("所有文件","*.*")])
         if not path: return
+        table = self.table_choice.get()
         try:
-            df = read_any(path)
+            use = read_and_pick(path, table)
         except Exception as e:
             messagebox.showerror("失败", f"读取失败：{e}"); return
-        rows = []; raw_src = os.path.basename(path)
-        if self.table_choice.get()=="cnaps":
-            use = pick_cnaps(df)
-            for _, r in use.iterrows():
-                code = r.get("BNKCODE",""); name = r.get("LNAME","")
-                if re.fullmatch(r"\d{12}", str(code) or ""):
-                    raw = "|".join([str(r.get(c,"")) for c in ["BNKCODE","CLSCODE","CITYCODE","LNAME"]])
-                    rows.append((str(code), str(name), raw, raw_src))
-            table="cnaps"
-        else:
-            use = pick_ibps(df)
-            for _, r in use.iterrows():
-                code = r.get("code",""); name = r.get("name","")
-                if re.fullmatch(r"\d{12}", str(code) or ""):
-                    raw = "|".join([str(r.get(c,"")) for c in ["code","name"]])
-                    rows.append((str(code), str(name), raw, raw_src))
-            table="ibps"
+        raw_src = os.path.basename(path)
+        rows = codebook_rows(use, table, raw_src)
         if not rows:
             messagebox.showwarning("提示","未发现有效的12位行号记录（请检查文件内容/编码/格式）"); return
-        if messagebox.askyesno("导入方式", "选择“是”= 全量替换；“否”= 增量合并（按 code upsert）"):
-            replace_all(DB_PATH, table, rows)
-        else:
-            upsert_many_batched(DB_PATH, table, rows, batch_size=20000)
-        messagebox.showinfo("成功", f"导入完成：共 {len(rows)} 条")
+        replace = messagebox.askyesno("导入方式", "选择“是”= 全量替换；“否”= 增量合并（按 code upsert）")
+        info = import_rows(DB_PATH, table, rows, replace=replace, source=raw_src)
+        self._refresh_versions()
+        fmt = describe_txt_format(use.attrs.get("txt_format"))
+        msg = (f"导入完成：共 {len(rows)} 条\n版本 v{info['version']}：新增 {info['added']}，"
+               f"变更 {info['changed']}，删除 {info['removed']}")
+        messagebox.showinfo("成功", msg + (f"\n（{fmt}）" if fmt else ""))
+
+    # ---- 监视文件夹 ----
+    def toggle_watch(self):
+        if self.watcher:
+            self.watcher.stop(); self.watcher = None
+            self.watch_btn.configure(text="监视文件夹…"); self.watch_status.set("")
+            return
+        folder = filedialog.askdirectory(title="选择要监视的行号文件夹")
+        if not folder: return
+        if not watch_index(DB_PATH, os.path.abspath(folder)) and os.listdir(folder):
+            if messagebox.askyesno("监视文件夹", "是否把文件夹中现有文件视为已导入？\n“是”= 只导入之后新增/变更的文件；“否”= 现有文件也按修改时间依次导入"):
+                mark_existing(DB_PATH, os.path.abspath(folder))
+        self.start_watch(folder)
+
+    def _auto_watch(self):
+        folder = os.path.abspath(WATCH_DIR)
+        if not WATCH_IMPORT_EXISTING and not watch_index(DB_PATH, folder):
+            mark_existing(DB_PATH, folder)
+        self.start_watch(folder)
+
+    def start_watch(self, folder):
+        self.watcher = FolderWatcher(folder, DB_PATH, import_codebook_file)
+        self.watcher.start()
+        self.watch_btn.configure(text="停止监视")
+        self.watch_status.set(f"正在监视：{self.watcher.folder}")
+        self._poll_watch(self.watcher)
+
+    def _poll_watch(self, watcher):
+        # 界面线程只取事件队列，不触碰文件系统
+        if watcher is not self.watcher or not self.winfo_exists(): return
+        imported = False
+        while True:
+            try:
+                kind, name, detail = watcher.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "ok":
+                table, info = detail; imported = True
+                msg = (f"{name} → {table.upper()} v{info['version']}：新增 {info['added']}，"
+                       f"变更 {info['changed']}")
+            elif kind == "skip":
+                msg = f"{name}：{detail}，已跳过"
+            else:
+                msg = f"{name or '扫描'}：导入失败（{detail}）"
+            self.watch_status.set(f"正在监视：{watcher.folder}　最近：{msg}")
+        if imported:
+            self._refresh_versions()
+        self.after(500, lambda: self._poll_watch(watcher))
+
+    def _refresh_versions(self):
+        labels = ["当前"]
+        for v in list_versions(DB_PATH, self.table_choice.get()):
+            labels.append(f"v{v['version']}  {v['created_at']}  {v['mode']}  "
+                          f"+{v['added']} ~{v['changed']} -{v['removed']}")
+        self.version_box["values"] = labels
+        if self.version_choice.get() not in labels:
+            self.version_choice.set("当前")
+
+    def jump_to_date(self):
+        # 查看某天（如上月导出批次当天）生效的库内容：取当天结束前最后一个版本
+        try:
+            day = datetime.strptime(self.as_of.get().strip(), "%Y-%m-%d")
+        except ValueError:
+            messagebox.showwarning("提示", "日期格式应为 YYYY-MM-DD"); return
+        # created_at 为 UTC，按本地时间当天 23:59:59 换算
+        when = (day + timedelta(days=1, seconds=-1)).astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        v = version_at(DB_PATH, self.table_choice.get(), when)
+        if v is None:
+            messagebox.showinfo("提示", "该日期之前尚无导入记录"); return
+        label = next((x for x in self.version_box["values"] if x.startswith(f"v{v} ")), None)
+        if label is None:
+            self._refresh_versions()
+            label = next((x for x in self.version_box["values"] if x.startswith(f"v{v} ")), "当前")
+        self.version_choice.set(label); self.search()
+
+    def _selected_version(self):
+        m = re.match(r"v(\d+)", self.version_choice.get())
+        return int(m.group(1)) if m else None
+
+    def _fetch(self, keyword, limit):
+        table = self.table_choice.get(); v = self._selected_version()
+        filters = {c: var.get() for c, var in self.filters.items()} if table == "cnaps" else None
+        if v is None:
+            return query(DB_PATH, table, keyword, limit=limit, filters=filters)
+        return query_as_of(DB_PATH, table, keyword, v, limit=limit, filters=filters)
 
     def search(self):
-        table = self.table_choice.get()
-        rows = query(DB_PATH, table, self.kw.get().strip(), limit=5000)
+        table = self.table_choice.get(); kw = self.kw.get().strip()
+        v = self._selected_version()
+        if v is None:
+            filters = {c: var.get() for c, var in self.filters.items()} if table == "cnaps" else None
+            self._set_columns(TABLE_COLS[table])
+            self.pager.start(table, kw, filters, columns=TABLE_COLS[table])
+            return
+        self.pager.stop()
+        rows = self._fetch(kw, 5000)
         import pandas as pd
         df = pd.DataFrame(rows) if rows else pd.DataFrame(columns=["code","name"])
         self._load_df(df)
+        self.status.set(f"版本 v{v}：显示 {len(df)} 条")
 
     def export_db(self):
-        rows = query(DB_PATH, self.table_choice.get(), "", limit=999999)
+        rows = self._fetch("", 999999)
         if not rows:
             messagebox.showinfo("提示","当前库为空"); return
         import pandas as pd
@@ -397,12 +998,16 @@ class LibraryTab(ttk.Frame):
         except Exception as e:
             messagebox.showerror("失败", f"导出失败：{e}")
 
-    def _load_df(self, df):
+    def _set_columns(self, cols):
         tree = self.stree.tree
-        tree["columns"] = list(df.columns)
-        for col in df.columns:
+        tree["columns"] = list(cols)
+        for col in cols:
             tree.heading(col, text=col)
             tree.column(col, width=220 if col=="name" else 160, anchor="w")
+
+    def _load_df(self, df):
+        tree = self.stree.tree
+        self._set_columns(df.columns)
         tree.delete(*tree.get_children())
         batch = []
         for _, row in df.iterrows():
@@ -413,6 +1018,187 @@ class LibraryTab(ttk.Frame):
         for vals in batch:
             tree.insert("", "end", values=vals)
 
+# ---------------- 分批导出 ----------------
+class ChunkExportDialog(tk.Toplevel):
+    def __init__(self, master, base_name, split_options, max_rows=5000):
+        super().__init__(master)
+        self.title("分批导出"); self.resizable(True, True)
+        self.values = {}
+        self.split_options = split_options
+        frm = ttk.Frame(self, padding=12); frm.pack(fill="both", expand=True)
+        self.v_rows = tk.StringVar(value=str(max_rows))
+        self.v_by = tk.StringVar(value=list(split_options)[0])
+        self.v_base = tk.StringVar(value=base_name)
+        ttk.Label(frm, text="每个文件最大行数：").grid(row=0, column=0, sticky="e", padx=6, pady=6)
+        ttk.Entry(frm, textvariable=self.v_rows, width=12).grid(row=0, column=1, sticky="w", padx=6, pady=6)
+        ttk.Label(frm, text="（按网银上传单文件行数上限填写）", foreground="#666").grid(row=0, column=2, sticky="w", padx=6)
+        ttk.Label(frm, text="拆分依据：").grid(row=1, column=0, sticky="e", padx=6, pady=6)
+        ttk.Combobox(frm, textvariable=self.v_by, state="readonly", values=list(split_options)).grid(row=1, column=1, sticky="w", padx=6, pady=6)
+        ttk.Label(frm, text="文件名前缀：").grid(row=2, column=0, sticky="e", padx=6, pady=6)
+        ttk.Entry(frm, textvariable=self.v_base, width=24).grid(row=2, column=1, sticky="w", padx=6, pady=6)
+        btns = ttk.Frame(self, padding=8); btns.pack(fill="x")
+        ttk.Button(btns, text="确定", command=self.ok).pack(side="right", padx=8)
+        ttk.Button(btns, text="取消", command=self.destroy).pack(side="right")
+        self.bind("<Return>", lambda e: self.ok())
+        self.after(10, lambda: center_and_autosize(self, min_w=520, min_h=220))
+
+    def ok(self):
+        try:
+            n = int(self.v_rows.get().strip())
+            if n <= 0: raise ValueError
+        except Exception:
+            messagebox.showwarning("校验不通过", "每个文件最大行数 必须为正整数"); return
+        base = self.v_base.get().strip()
+        if not base:
+            messagebox.showwarning("校验不通过", "文件名前缀 不能为空"); return
+        self.values = {"max_rows": n, "by": self.split_options[self.v_by.get()], "base": base}
+        self.destroy()
+
+def run_chunk_export(tab, df, *, include_header, base_name, split_options):
+    dlg = ChunkExportDialog(tab, base_name, split_options, getattr(tab, "_chunk_rows", 5000)); tab.wait_window(dlg)
+    opts = dlg.values
+    if not opts: return
+    tab._chunk_rows = opts["max_rows"]
+    out_dir = filedialog.askdirectory(title="选择导出目录")
+    if not out_dir: return
+    old = existing_outputs(out_dir, opts["base"], chunk_paths(df, out_dir, opts["base"], opts["max_rows"], opts["by"]))
+    if old:
+        names = "\n".join(os.path.basename(p) for p in old[:10]) + ("\n..." if len(old) > 10 else "")
+        if not messagebox.askyesno("目录中已有旧文件", f"以下 {len(old)} 个文件（上次导出清单所列或与本次重名）将被删除/覆盖：\n{names}\n\n"
+                                                 "是否继续？（选“否”可换目录或改文件名前缀）"):
+            return
+    box = {}
+    def work():
+        try:
+            box["result"] = export_chunks(df, out_dir, opts["base"], opts["max_rows"], by=opts["by"],
+                                          include_header=include_header, amount_col="金额", overwrite=bool(old))
+        except Exception as e:
+            box["error"] = e
+    th = threading.Thread(target=work, daemon=True); th.start()
+    tab.configure(cursor="watch")
+    def poll():
+        if th.is_alive():
+            tab.after(200, poll); return
+        tab.configure(cursor="")
+        if "error" in box:
+            messagebox.showerror("失败", f"分批导出失败：{box['error']}"); return
+        manifest, manifest_path = box["result"]
+        total = sum((m["amount"] for m in manifest), Decimal(0))
+        messagebox.showinfo("成功", f"已导出 {len(manifest)} 个文件，共 {sum(m['rows'] for m in manifest)} 行，"
+                                    f"金额合计 {total:,f}\n清单：{os.path.basename(manifest_path)}")
+    poll()
+
+# ---------------- 多文件合并导入 ----------------
+SRC_COLS = ["来源文件", "来源行号"]
+PAYROLL_COLS = ["收款人银行名称","收款人卡号","收款人名称","金额"]
+TRANSFER_COLS = ["收款方账号","收款方户名","金额","转账方式","行别信息类型",
+                 "收款方银行名称","收款方银行大额支付行号/跨行清算行号","用途","明细标注"]
+
+def _rule_messages(rows, rules, fmt):
+    # rules: [(布尔 Series, 说明)]；按行输出 fmt.format(n=行号, msg=说明)，返回 (问题行掩码, 提示列表)
+    masks = [(m.to_numpy(dtype=bool), msg) for m, msg in rules]
+    bad = np.zeros(len(rows), dtype=bool)
+    for m, _ in masks: bad |= m
+    msgs = [fmt.format(n=rows[i], msg=msg) for i in np.flatnonzero(bad) for m, msg in masks if m[i]]
+    return bad, msgs
+
+def _with_source(df, path, rows):
+    df = df.copy()
+    df["来源文件"] = os.path.basename(path); df["来源行号"] = [str(n) for n in rows]
+    return df.reset_index(drop=True)
+
+def prepare_payroll(path: str):
+    # 读取并清洗单个代发工资文件：问题行剔除并返回提示（与原单文件导入规则一致）
+    df = read_any(path)
+    cols = [str(c).strip().replace("\ufeff","") for c in df.columns]
+    df.columns = cols
+    if set(PAYROLL_COLS).issubset(set(cols)):
+        df = df[PAYROLL_COLS].copy()
+    else:
+        df = df.iloc[:, :4].copy(); df.columns = PAYROLL_COLS
+    for c in PAYROLL_COLS:
+        df[c] = df[c].fillna("").astype(str).str.replace("\u3000", " ").str.strip()
+    rows = np.arange(1, len(df) + 1)
+    keep = df.ne("").any(axis=1).to_numpy()
+    df, rows = df[keep], rows[keep]
+    amt = pd.to_numeric(df["金额"], errors="coerce")
+    bad, msgs = _rule_messages(rows, [
+        (df["收款人银行名称"].eq(""), "银行名称为空"),
+        (~df["收款人卡号"].str.fullmatch(r"\d{6,32}"), "卡号非6-32位数字"),
+        (amt <= 0, "金额≤0"),
+        (amt.isna(), "金额非数字"),
+        (df["收款人名称"].eq(""), "收款人名称为空"),
+    ], "第{n}行 {msg}")
+    return _with_source(df[~bad], path, rows[~bad]), msgs, int(bad.sum())
+
+def prepare_transfer(path: str):
+    # 读取并校验单个批量转账文件：有问题时整批中止，故只返回提示不剔除
+    df = read_any(path)
+    if not set(TRANSFER_COLS).issubset(set(df.columns)):
+        df = df.iloc[:, :9]; df.columns = TRANSFER_COLS
+    df = df[TRANSFER_COLS].fillna("").astype(str)
+    rows = np.arange(1, len(df) + 1)
+    amt = pd.to_numeric(df["金额"], errors="coerce")
+    mode = df["转账方式"].str.strip()
+    _, msgs = _rule_messages(rows, [
+        (~df["收款方账号"].str.fullmatch(r"\d{6,32}"), "收款方账号 非6-32位数字"),
+        (df["收款方户名"].str.strip().eq(""), "收款方户名 为空"),
+        (amt <= 0, "金额 ≤ 0"),
+        (amt.isna(), "金额 非数字"),
+        (~mode.isin(["0","1"]), "转账方式 非 0/1"),
+        (~df["行别信息类型"].str.strip().isin(["","0","1"]), "行别信息类型 只能为空/0/1"),
+        (mode.eq("1") & df["收款方银行大额支付行号/跨行清算行号"].str.strip().eq(""), "跨行转账需提供行号"),
+    ], "第{n}行：{msg}")
+    return _with_source(df, path, rows), msgs, 0
+
+def _prepare_safe(prepare, path):
+    try:
+        df, msgs, skipped = prepare(path)
+        return {"path": path, "df": df, "msgs": msgs, "skipped": skipped}
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+
+def load_many(paths, prepare, workers: int = None):
+    # 多个文件并发读取+校验（进程池），结果按所选顺序返回
+    paths = list(paths)
+    workers = min(len(paths), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return [_prepare_safe(prepare, p) for p in paths]
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(_prepare_safe, [prepare] * len(paths), paths))
+
+def merge_parts(parts, cols):
+    frames = [r["df"] for r in parts if "df" in r]
+    if not frames:
+        return pd.DataFrame(columns=cols + SRC_COLS)
+    return pd.concat(frames, ignore_index=True)
+
+def run_merge_import(tab, prepare, done, filetypes):
+    paths = filedialog.askopenfilenames(filetypes=filetypes)
+    if not paths: return
+    box = {}
+    def work():
+        try:
+            box["parts"] = load_many(paths, prepare)
+        except Exception as e:
+            box["error"] = e
+    th = threading.Thread(target=work, daemon=True); th.start()
+    tab.configure(cursor="watch")
+    def poll():
+        if th.is_alive():
+            tab.after(100, poll); return
+        tab.configure(cursor="")
+        if "error" in box:
+            messagebox.showerror("失败", f"读取失败：{box['error']}"); return
+        parts = box["parts"]
+        failed = [r for r in parts if "error" in r]
+        if failed:
+            lines = [f"{os.path.basename(r['path'])}：{r['error']}" for r in failed]
+            messagebox.showerror("失败", "读取失败，导入中止：\n" + "\n".join(lines[:20]) + ("\n..." if len(lines) > 20 else ""))
+            return
+        done(parts)
+    poll()
+
 # ---------------- 代发工资 Tab ----------------
 class PayrollDialog(tk.Toplevel):
     COLS = ["收款人银行名称","收款人卡号","收款人名称","金额"]
@@ -464,7 +1250,7 @@ class PayrollDialog(tk.Toplevel):
         self.values = vals; self.destroy()
 
 class PayrollTab(ttk.Frame):
-    COLS = ["收款人银行名称","收款人卡号","收款人名称","金额"]
+    COLS = PAYROLL_COLS
     def __init__(self, master):
         super().__init__(master)
         self.df = pd.DataFrame(columns=self.COLS)
@@ -477,7 +1263,10 @@ class PayrollTab(ttk.Frame):
         ttk.Button(top, text="删除选中", command=self.delete_selected).pack(side="left", padx=6)
         ttk.Button(top, text="导入代发工资文件", command=self.import_file).pack(side="left", padx=12)
         ttk.Button(top, text="校验并导出（无表头）", command=self.validate_export).pack(side="left", padx=6)
+        ttk.Button(top, text="分批导出…", command=self.chunk_export).pack(side="left", padx=6)
+        bar = ttk.Frame(self); bar.pack(fill="x", padx=8)
         self.stree = ScrollableTree(self, height=18); self.stree.pack(fill="both", expand=True, padx=8, pady=6)
+        self.view = GridView(self.stree.tree, numeric_cols=["金额", "来源行号"]); self.view.build_toolbar(bar)
         try:
             _install_watermark(self, str(APP_DIR / "bg.jpg"), opacity=0.08)
         except Exception:
@@ -487,75 +1276,60 @@ class PayrollTab(ttk.Frame):
     def _reload(self):
         tree = self.stree.tree
         df = self.df.fillna("")
-        tree["columns"] = list(self.COLS)
-        for col in self.COLS:
+        cols = list(df.columns)  # 多文件合并导入时含 来源文件/来源行号
+        tree["columns"] = cols
+        for col in cols:
             tree.heading(col, text=col)
             width = 240 if "银行名称" in col else 180
             tree.column(col, width=width, anchor="w")
-        tree.delete(*tree.get_children())
+        self.view.clear()
         batch = []
-        for _, row in df.iterrows():
-            batch.append([str(row.get(c, "")) for c in self.COLS])
+        for i, (_, row) in enumerate(df.iterrows()):
+            batch.append((str(i), [str(row.get(c, "")) for c in cols]))
             if len(batch) >= 1000:
-                for vals in batch: tree.insert("", "end", values=vals)
+                for iid, vals in batch: tree.insert("", "end", iid=iid, values=vals)
                 batch.clear(); tree.update_idletasks()
-        for vals in batch:
-            tree.insert("", "end", values=vals)
+        for iid, vals in batch:
+            tree.insert("", "end", iid=iid, values=vals)
+        self.view.bind(self.df, self._invalid_mask(df))
 
     def import_file(self):
-        path = filedialog.askopenfilename(filetypes=[("Excel/CSV","*.xlsx;*.xls;*.csv"), ("所有文件","*.*")])
-        if not path: return
-        try:
-            df = read_any(path)
-        except Exception as e:
-            messagebox.showerror("失败", f"读取失败：{e}"); return
-
-        cols = [str(c).strip().replace("\ufeff","") for c in list(df.columns)]
-        if set(self.COLS).issubset(set(cols)):
-            df = df[self.COLS].copy()
-        else:
-            df = df.iloc[:, :4].copy()
-            df.columns = self.COLS
-
-        def _strip(s):
-            return "" if pd.isna(s) else str(s).replace("\u3000"," ").strip()
-        for c in self.COLS:
-            df[c] = df[c].map(_strip)
-        df = df[~(df[self.COLS].apply(lambda r: all(x=="" for x in r), axis=1))].reset_index(drop=True)
-
-        warnings = []; bad_rows = []
-        for idx, r in df.iterrows():
-            ok = True
-            if r["收款人银行名称"] == "": ok = False; warnings.append(f"第{idx+1}行 银行名称为空")
-            if not re.fullmatch(r"\d{6,32}", r["收款人卡号"]): ok = False; warnings.append(f"第{idx+1}行 卡号非6-32位数字")
-            try:
-                if float(r["金额"]) <= 0: ok = False; warnings.append(f"第{idx+1}行 金额≤0")
-            except Exception:
-                ok = False; warnings.append(f"第{idx+1}行 金额非数字")
-            if r["收款人名称"] == "": ok = False; warnings.append(f"第{idx+1}行 收款人名称为空")
-            if not ok: bad_rows.append(idx)
-        if bad_rows:
-            df = df.drop(index=bad_rows).reset_index(drop=True)
+        # 可多选：各文件并发读取校验后一次性合并加载，保留来源文件与行号
+        run_merge_import(self, prepare_payroll, self._merged,
+                         [("Excel/CSV","*.xlsx;*.xls;*.csv"), ("所有文件","*.*")])
 
-        self.df = df
+    def _merged(self, parts):
+        self.df = merge_parts(parts, self.COLS)
         self._reload()
 
-        total = len(df) + len(bad_rows)
+        skipped = sum(r["skipped"] for r in parts)
         shown = len(self.df)
-        msg = f"导入处理完成：源行数 {total}，有效 {shown} 行"
-        if bad_rows:
-            msg += f"；已跳过 {len(bad_rows)} 行（建议在源文件修正后再导）"
+        msg = f"导入处理完成：源行数 {shown + skipped}，有效 {shown} 行"
+        if len(parts) > 1:
+            msg = f"已合并 {len(parts)} 个文件。" + msg
+        if skipped:
+            msg += f"；已跳过 {skipped} 行（建议在源文件修正后再导）"
+            lines = [f"{os.path.basename(r['path'])} {m}" if len(parts) > 1 else m for r in parts for m in r["msgs"]]
+            msg += "\n\n" + "\n".join(lines[:10]) + ("\n..." if len(lines) > 10 else "")
         messagebox.showinfo("成功", msg)
 
+    def _invalid_mask(self, df):
+        # 与 _check 相同的规则，逐行标出问题行，供“仅显示问题行”使用
+        bad = df["收款人银行名称"].astype(str).str.strip().eq("")
+        bad |= ~df["收款人卡号"].astype(str).str.fullmatch(r"\d{6,32}", na=False)
+        bad |= ~(pd.to_numeric(df["金额"], errors="coerce") > 0)
+        bad |= df["收款人名称"].astype(str).str.strip().eq("")
+        return bad.to_numpy()
+
     def add_one(self):
         dlg = PayrollDialog(self); self.wait_window(dlg)
         if getattr(dlg, "values", None):
-            self.df.loc[len(self.df)] = [dlg.values.get(c,"") for c in self.COLS]; self._reload()
+            self.df.loc[len(self.df)] = [dlg.values.get(c,"") for c in self.df.columns]; self._reload()
 
     def edit_one(self):
         tree = self.stree.tree; sel = tree.selection()
         if not sel: messagebox.showinfo("提示","请先选择一行"); return
-        idx = tree.index(sel[0]); init = {c: str(self.df.iloc[idx][c]) for c in self.COLS}
+        idx = int(sel[0]); init = {c: str(self.df.iloc[idx][c]) for c in self.COLS}
         dlg = PayrollDialog(self, init_values=init); self.wait_window(dlg)
         if getattr(dlg, "values", None):
             for c in self.COLS: self.df.at[self.df.index[idx], c] = dlg.values.get(c,"")
@@ -564,9 +1338,9 @@ class PayrollTab(ttk.Frame):
     def delete_selected(self):
         tree = self.stree.tree; sel = tree.selection()
         if not sel: return
-        idx = tree.index(sel[0]); self.df = self.df.drop(self.df.index[idx]).reset_index(drop=True); self._reload()
+        idx = int(sel[0]); self.df = self.df.drop(self.df.index[idx]).reset_index(drop=True); self._reload()
 
-    def validate_export(self):
+    def _check(self):
         df = self.df.fillna("")
         probs = []
         if df["收款人银行名称"].str.strip().eq("").any(): probs.append("存在 银行名称 为空的记录")
@@ -575,12 +1349,24 @@ class PayrollTab(ttk.Frame):
             if (pd.to_numeric(df["金额"], errors="coerce")<=0).any(): probs.append("存在 金额≤0 或非数字")
         except Exception:
             probs.append("金额列解析异常")
-        if probs: messagebox.showwarning("校验结果","；".join(probs))
+        report = batch_check(df, "收款人卡号", "金额", ["收款人银行名称"])
+        probs += batch_warnings(report)
+        summary = batch_summary(report, {"收款人银行名称":"按银行"})
+        if probs: messagebox.showwarning("校验结果","；".join(probs) + "\n\n" + summary)
+        else: messagebox.showinfo("批次汇总", summary)
+
+    def validate_export(self):
+        self._check()
         path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel",".xlsx")])
         if not path: return
-        export_text_xlsx(self.df, path, include_header=False)
+        export_text_xlsx(self.df[self.COLS], path, include_header=False)
         messagebox.showinfo("成功","已导出（无表头，文本格式）")
 
+    def chunk_export(self):
+        self._check()
+        run_chunk_export(self, self.df[self.COLS].copy(), include_header=False, base_name="代发工资",
+                         split_options={"不拆分": None, "按银行": "收款人银行名称"})
+
 # ---------------- 批量转账 Tab ----------------
 class TransferDialog(tk.Toplevel):
     COLS = ["收款方账号","收款方户名","金额","转账方式","行别信息类型",
@@ -676,8 +1462,7 @@ class TransferDialog(tk.Toplevel):
         self.values = v; self.destroy()
 
 class TransferTab(ttk.Frame):
-    COLS = ["收款方账号","收款方户名","金额","转账方式","行别信息类型",
-            "收款方银行名称","收款方银行大额支付行号/跨行清算行号","用途","明细标注"]
+    COLS = TRANSFER_COLS
     def __init__(self, master):
         super().__init__(master)
         self.df = pd.DataFrame(columns=self.COLS); self._build()
@@ -688,7 +1473,10 @@ class TransferTab(ttk.Frame):
         ttk.Button(top, text="删除选中", command=self.delete_selected).pack(side="left", padx=6)
         ttk.Button(top, text="导入批量转账文件", command=self.import_file).pack(side="left", padx=12)
         ttk.Button(top, text="校验并导出（保留表头）", command=self.validate_export).pack(side="left", padx=6)
+        ttk.Button(top, text="分批导出…", command=self.chunk_export).pack(side="left", padx=6)
+        bar = ttk.Frame(self); bar.pack(fill="x", padx=8)
         self.stree = ScrollableTree(self, height=18); self.stree.pack(fill="both", expand=True, padx=8, pady=6)
+        self.view = GridView(self.stree.tree, numeric_cols=["金额", "来源行号"]); self.view.build_toolbar(bar)
         try:
             _install_watermark(self, str(APP_DIR / "bg.jpg"), opacity=0.08)
         except Exception:
@@ -702,23 +1490,33 @@ class TransferTab(ttk.Frame):
             tree.heading(col, text=col)
             width = 220 if ("名称" in col or "用途" in col or "明细" in col) else 160
             tree.column(col, width=width, anchor="w")
-        tree.delete(*tree.get_children())
+        self.view.clear()
         batch = []
-        for _, row in df.iterrows():
-            batch.append([str(row.get(c,"")) for c in df.columns])
+        for i, (_, row) in enumerate(df.iterrows()):
+            batch.append((str(i), [str(row.get(c,"")) for c in df.columns]))
             if len(batch) >= 1000:
-                for vals in batch: tree.insert("", "end", values=vals)
+                for iid, vals in batch: tree.insert("", "end", iid=iid, values=vals)
                 batch.clear(); tree.update_idletasks()
-        for vals in batch:
-            tree.insert("", "end", values=vals)
+        for iid, vals in batch:
+            tree.insert("", "end", iid=iid, values=vals)
+        self.view.bind(df, self._invalid_mask(df.fillna("")))
+    def _invalid_mask(self, df):
+        bad = ~df["收款方账号"].astype(str).str.fullmatch(r"\d{6,32}", na=False)
+        bad |= df["收款方户名"].astype(str).str.strip().eq("")
+        bad |= ~(pd.to_numeric(df["金额"], errors="coerce") > 0)
+        mode = df["转账方式"].astype(str).str.strip()
+        bad |= ~mode.isin(["0","1"])
+        bad |= ~df["行别信息类型"].astype(str).str.strip().isin(["","0","1"])
+        bad |= mode.eq("1") & df["收款方银行大额支付行号/跨行清算行号"].astype(str).str.strip().eq("")
+        return bad.to_numpy()
     def add_one(self):
         dlg = TransferDialog(self); self.wait_window(dlg)
         if getattr(dlg, "values", None):
-            self.df.loc[len(self.df)] = [dlg.values.get(c,"") for c in self.COLS]; self._reload()
+            self.df.loc[len(self.df)] = [dlg.values.get(c,"") for c in self.df.columns]; self._reload()
     def edit_one(self):
         tree = self.stree.tree; sel = tree.selection()
         if not sel: messagebox.showinfo("提示","请先选择一行"); return
-        idx = tree.index(sel[0]); init = {c: str(self.df.iloc[idx][c]) for c in self.COLS}
+        idx = int(sel[0]); init = {c: str(self.df.iloc[idx][c]) for c in self.COLS}
         dlg = TransferDialog(self, init_values=init); self.wait_window(dlg)
         if getattr(dlg, "values", None):
             for c in self.COLS: self.df.at[self.df.index[idx], c] = dlg.values.get(c,"")
@@ -726,38 +1524,18 @@ class TransferTab(ttk.Frame):
     def delete_selected(self):
         tree = self.stree.tree; sel = tree.selection()
         if not sel: return
-        idx = tree.index(sel[0]); self.df = self.df.drop(self.df.index[idx]).reset_index(drop=True); self._reload()
+        idx = int(sel[0]); self.df = self.df.drop(self.df.index[idx]).reset_index(drop=True); self._reload()
     def import_file(self):
-        path = filedialog.askopenfilename(filetypes=[("Excel/CSV","*.xlsx;*.xls;*.csv")])
-        if not path: return
-        try:
-            df = read_any(path)
-        except Exception as e:
-            messagebox.showerror("失败", f"读取失败：{e}"); return
-        need = self.COLS
-        if not set(need).issubset(set(df.columns)):
-            df = df.iloc[:, :9]
-            df.columns = need
-        errors = []
-        for idx, r in df.fillna("").iterrows():
-            if not re.fullmatch(r"\d{6,32}", str(r["收款方账号"])): errors.append(f"第{idx+1}行：收款方账号 非6-32位数字")
-            if str(r["收款方户名"]).strip()=="" : errors.append(f"第{idx+1}行：收款方户名 为空")
-            try:
-                if float(str(r["金额"]))<=0: errors.append(f"第{idx+1}行：金额 ≤ 0")
-            except Exception:
-                errors.append(f"第{idx+1}行：金额 非数字")
-            mode = str(r["转账方式"]).strip()
-            if mode not in ("0","1"): errors.append(f"第{idx+1}行：转账方式 非 0/1")
-            btype = str(r["行别信息类型"]).strip()
-            if btype not in ("","0","1"): errors.append(f"第{idx+1}行：行别信息类型 只能为空/0/1")
-            if mode=="1" and str(r["收款方银行大额支付行号/跨行清算行号"]).strip()=="":
-                errors.append(f"第{idx+1}行：跨行转账需提供行号")
+        run_merge_import(self, prepare_transfer, self._merged, [("Excel/CSV","*.xlsx;*.xls;*.csv")])
+    def _merged(self, parts):
+        errors = [f"{os.path.basename(r['path'])} {m}" if len(parts) > 1 else m for r in parts for m in r["msgs"]]
         if errors:
-            messagebox.showerror("校验失败","导入中止：\\n" + "\\n".join(errors[:30]) + ("\\n..." if len(errors)>30 else ""))
+            messagebox.showerror("校验失败","导入中止：\n" + "\n".join(errors[:30]) + ("\n..." if len(errors)>30 else ""))
             return
-        self.df = df[self.COLS].astype(str); self._reload()
-        messagebox.showinfo("成功","导入成功，已加载到下方明细，可继续编辑。")
-    def validate_export(self):
+        self.df = merge_parts(parts, self.COLS); self._reload()
+        extra = f"已合并 {len(parts)} 个文件共 {len(self.df)} 行，" if len(parts) > 1 else ""
+        messagebox.showinfo("成功", f"导入成功，{extra}已加载到下方明细，可继续编辑。")
+    def _check(self):
         df = self.df.fillna("")
         probs = []
         if (~df["收款方账号"].astype(str).str.match(r"^\\d{6,32}$", na=False)).any(): probs.append("收款方账号 格式异常")
@@ -769,11 +1547,21 @@ class TransferTab(ttk.Frame):
         cross = df["转账方式"].astype(str).str.strip()=="1"
         need = cross & df["收款方银行大额支付行号/跨行清算行号"].astype(str).str.strip().eq("")
         if need.any(): probs.append("跨行转账时需提供行号（IBPS或CNAPS）")
-        if probs: messagebox.showwarning("校验结果","；".join(probs))
+        report = batch_check(df, "收款方账号", "金额", ["转账方式", "收款方银行名称"])
+        probs += batch_warnings(report)
+        summary = batch_summary(report, {"转账方式":"按转账方式", "收款方银行名称":"按银行"})
+        if probs: messagebox.showwarning("校验结果","；".join(probs) + "\n\n" + summary)
+        else: messagebox.showinfo("批次汇总", summary)
+    def validate_export(self):
+        self._check()
         path = filedialog.asksaveasfilename(defaultextension=".xlsx", filetypes=[("Excel",".xlsx")])
         if not path: return
-        export_text_xlsx(self.df, path, include_header=True)
+        export_text_xlsx(self.df[self.COLS], path, include_header=True)
         messagebox.showinfo("成功","已导出（保留表头，文本格式）")
+    def chunk_export(self):
+        self._check()
+        run_chunk_export(self, self.df[self.COLS].copy(), include_header=True, base_name="批量转账",
+                         split_options={"不拆分": None, "按转账方式": "转账方式", "按银行": "收款方银行名称"})
 
 # ---------------- 帮助菜单：环境自检 ----------------
 def show_env_check():
@@ -841,6 +1629,7 @@ class App(tk.Tk):
 
         helpm = tk.Menu(menubar, tearoff=0)
         helpm.add_command(label="环境自检与修复…", command=show_env_check)
+        helpm.add_command(label="清除解析缓存", command=lambda: (clear_parse_cache(CACHE_DIR), messagebox.showinfo("提示","解析缓存已清除")))
         helpm.add_separator()
         helpm.add_command(label="关于", command=lambda: messagebox.showinfo("关于","华夏离线批量编辑器 v2.3.6-r3"))
         menubar.add_cascade(label="帮助", menu=helpm)
@@ -861,4 +1650,6 @@ class App(tk.Tk):
                 pass
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()  # 打包后进程池子进程需要
     App().mainloop()
@@ -0,0 +1,120 @@
+
+import csv, os, re
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+import pandas as pd
+
+# 子进程执行的任务只依赖本模块（pandas/openpyxl）；spawn 方式（Windows/打包）下子进程仍会重新导入主模块，
+# 因此主模块的启动代码必须放在 if __name__ == "__main__" 之下
+
+def export_text_xlsx(df: pd.DataFrame, path: str, *, include_header: bool = True):
+    # write_only 模式逐行流式写出，单元格统一为文本格式 "@"
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    wb = Workbook(write_only=True); ws = wb.create_sheet("Sheet1")
+    def text_row(values):
+        row = []
+        for v in values:
+            cell = WriteOnlyCell(ws, value="" if pd.isna(v) else str(v)); cell.number_format="@"
+            row.append(cell)
+        return row
+    if include_header:
+        ws.append(text_row(df.columns))
+    for values in df.itertuples(index=False, name=None):
+        ws.append(text_row(values))
+    wb.save(path)
+
+def split_batch(df: pd.DataFrame, max_rows: int, by: str = None):
+    # 先按 by 列分组（可选），每组再按 max_rows 切块；返回 [(分组值, 子表)]
+    max_rows = max(1, int(max_rows))
+    if by:
+        keys = df[by].fillna("").astype(str).str.strip()
+        groups = [(str(k), g) for k, g in df.groupby(keys, sort=True)]
+    else:
+        groups = [("", df)]
+    chunks = []
+    for key, g in groups:
+        for start in range(0, len(g), max_rows):
+            chunks.append((key, g.iloc[start:start + max_rows]))
+    return chunks
+
+def _amount_total(values):
+    total, bad = Decimal(0), 0
+    for v in values:
+        try:
+            d = Decimal(str(v).strip().replace(",", ""))
+        except (InvalidOperation, ValueError):
+            bad += 1; continue
+        if d.is_finite(): total += d
+        else: bad += 1
+    return total, bad
+
+def _write_chunk(df: pd.DataFrame, path: str, include_header: bool, amount_col: str = None):
+    export_text_xlsx(df, path, include_header=include_header)
+    total, bad = _amount_total(df[amount_col].fillna("").tolist()) if amount_col else (Decimal(0), 0)
+    return path, len(df), total, bad
+
+def _safe_name(s: str):
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", s).strip("_")[:40]
+
+def _plan(df: pd.DataFrame, out_dir: str, base_name: str, max_rows: int, by: str = None):
+    jobs = []
+    for i, (key, part) in enumerate(split_batch(df, max_rows, by), start=1):
+        tag = f"_{_safe_name(key)}" if by and key else ""
+        jobs.append((key, str(Path(out_dir) / f"{base_name}{tag}_{i:03d}.xlsx"), part))
+    return jobs
+
+def chunk_paths(df: pd.DataFrame, out_dir: str, base_name: str, max_rows: int, by: str = None):
+    return [path for _, path, _ in _plan(df, out_dir, base_name, max_rows, by)]
+
+def existing_outputs(out_dir: str, base_name: str, planned=()):
+    # 会被本次导出删除或覆盖的文件：上次同前缀导出的清单及其列出的分批文件，加上与本次文件名重名的文件。
+    # 只认清单里登记过的文件，手工放入的同前缀文件不会被当作旧批次
+    manifest = Path(out_dir) / f"{base_name}_manifest.csv"
+    found = set()
+    if manifest.is_file():
+        found.add(str(manifest))
+        try:
+            with open(manifest, newline="", encoding="utf-8-sig") as f:
+                for row in list(csv.reader(f))[1:]:
+                    name = os.path.basename(row[0]) if row else ""
+                    if name and name != "合计" and (Path(out_dir) / name).is_file():
+                        found.add(str(Path(out_dir) / name))
+        except (OSError, csv.Error):
+            pass
+    found.update(p for p in planned if os.path.isfile(p))
+    return sorted(found)
+
+def export_chunks(df: pd.DataFrame, out_dir: str, base_name: str, max_rows: int, *, by: str = None,
+                  include_header: bool = True, amount_col: str = None, workers: int = None,
+                  overwrite: bool = False):
+    # 目录里已有同前缀的旧批次或重名文件时拒绝写入；overwrite=True 先删除，避免残留的旧分批文件被误上传
+    jobs = _plan(df, out_dir, base_name, max_rows, by)
+    old = existing_outputs(out_dir, base_name, [path for _, path, _ in jobs])
+    if old and not overwrite:
+        raise FileExistsError(f"导出目录中已有 {len(old)} 个会被覆盖的文件：{os.path.basename(old[0])} 等")
+    for p in old:
+        os.remove(p)
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    if len(jobs) <= 1 or workers == 1:
+        results = [_write_chunk(part, path, include_header, amount_col) for _, path, part in jobs]
+    else:
+        workers = min(len(jobs), workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            futs = [ex.submit(_write_chunk, part, path, include_header, amount_col) for _, path, part in jobs]
+            results = [f.result() for f in futs]
+    manifest = []
+    for (key, _, _), (path, n, total, bad) in zip(jobs, results):
+        manifest.append({"file": os.path.basename(path), "group": key, "rows": n, "amount": total, "bad_amount": bad})
+    manifest_path = str(Path(out_dir) / f"{base_name}_manifest.csv")
+    with open(manifest_path, "w", newline="", encoding="utf-8-sig") as f:
+        w = csv.writer(f)
+        w.writerow(["文件", "分组", "行数", "金额合计", "金额无法解析行数"])
+        for m in manifest:
+            w.writerow([m["file"], m["group"], m["rows"], format(m["amount"], "f"), m["bad_amount"]])
+        w.writerow(["合计", "", sum(m["rows"] for m in manifest),
+                    format(sum((m["amount"] for m in manifest), Decimal(0)), "f"),
+                    sum(m["bad_amount"] for m in manifest)])
+    return manifest, manifest_path
@@ -0,0 +1,194 @@
+
+# 本地行号查询服务：python codebook_server.py --db codebook.db --host 0.0.0.0 --port 8765
+# 客户端（含本程序）设置环境变量 HX_CODEBOOK_URL=http://主机:8765 即改走该服务
+import argparse, json, os, queue, sqlite3, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import Request, urlopen
+
+from db_helper import TABLE_COLS, count_rows, ensure_db, query, query_page
+
+class ConnectionPool:
+    def __init__(self, db_path: str, size: int = 8):
+        self.db_path = db_path
+        self._q = queue.Queue()
+        uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+        for _ in range(size):
+            self._q.put(sqlite3.connect(uri, uri=True, check_same_thread=False))
+
+    def run(self, fn):
+        conn = self._q.get()
+        try:
+            return fn(conn)
+        finally:
+            self._q.put(conn)
+
+class CodebookIndex:
+    # 内存索引：{table: {code: {列: 值}}}；库文件变化（含 WAL）后最多 1 秒内自动重载
+    def __init__(self, db_path: str, pool: ConnectionPool, check_interval: float = 1.0):
+        self.db_path = db_path
+        self.pool = pool
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._checked = 0.0
+        self.tables = {}
+        self.refresh(force=True)
+
+    def _file_stamp(self):
+        stamp = []
+        for p in (self.db_path, self.db_path + "-wal"):
+            try:
+                st = os.stat(p); stamp.append((st.st_size, st.st_mtime_ns))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return
+        with self._lock:
+            self._checked = now
+            stamp = self._file_stamp()
+            if not force and stamp == self._stamp:
+                return
+            def load(conn):
+                tables = {}
+                for table, cols in TABLE_COLS.items():
+                    cur = conn.execute(f"SELECT {', '.join(cols)} FROM {table}")
+                    tables[table] = {r[0]: dict(zip(cols, r)) for r in cur}
+                return tables
+            self.tables = self.pool.run(load)
+            self._stamp = stamp
+
+    def lookup(self, table: str, codes):
+        self.refresh()
+        book = self.tables.get(table, {})
+        return {c: book[c] for c in codes if c in book}
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    index: CodebookIndex = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, obj, status: int = 200):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _table(self, params):
+        table = (params.get("table") or ["ibps"])[0]
+        if table not in TABLE_COLS:
+            raise ValueError(f"未知的库：{table}")
+        return table
+
+    def do_GET(self):
+        url = urlparse(self.path); params = parse_qs(url.query, keep_blank_values=True)  # 游标里的空名称也要保留
+        try:
+            if url.path == "/health":
+                self.index.refresh()
+                return self._send({"ok": True, "tables": {t: len(b) for t, b in self.index.tables.items()}})
+            table = self._table(params)
+            if url.path == "/lookup":
+                codes = [c for v in params.get("code", []) for c in v.split(",") if c]
+                return self._send({"rows": self.index.lookup(table, codes)})
+            if url.path == "/query":
+                kw = (params.get("kw") or [""])[0].strip()
+                limit = max(1, min(int((params.get("limit") or ["1000"])[0]), 100000))
+                filters = {c: params[c][0] for c in TABLE_COLS[table][2:] if c in params}
+                rows = self.index.pool.run(lambda conn: query(self.index.db_path, table, kw, limit, filters, conn=conn))
+                return self._send({"rows": rows})
+            if url.path == "/page":
+                kw = (params.get("kw") or [""])[0].strip()
+                size = max(1, min(int((params.get("size") or ["500"])[0]), 5000))
+                filters = {c: params[c][0] for c in TABLE_COLS[table][2:] if c in params}
+                if ("after_name" in params) != ("after_code" in params):
+                    raise ValueError("after_name 与 after_code 须同时提供")
+                after = (params["after_name"][0], params["after_code"][0]) if "after_code" in params else None
+                rows, nxt = self.index.pool.run(lambda conn: query_page(self.index.db_path, table, kw, after, size, filters, conn=conn))
+                return self._send({"rows": rows, "next": nxt})
+            if url.path == "/count":
+                kw = (params.get("kw") or [""])[0].strip()
+                filters = {c: params[c][0] for c in TABLE_COLS[table][2:] if c in params}
+                n, exact = self.index.pool.run(lambda conn: count_rows(self.index.db_path, table, kw, filters, conn=conn))
+                return self._send({"count": n, "exact": exact})
+            self._send({"error": "not found"}, 404)
+        except ValueError as e:
+            self._send({"error": str(e)}, 400)
+        except Exception as e:
+            self._send({"error": str(e)}, 500)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        try:
+            n = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(n) or b"{}")
+            if url.path == "/batch":
+                table = self._table({"table": [body.get("table", "ibps")]})
+                return self._send({"rows": self.index.lookup(table, [str(c) for c in body.get("codes", [])])})
+            self._send({"error": "not found"}, 404)
+        except ValueError as e:
+            self._send({"error": str(e)}, 400)
+        except Exception as e:
+            self._send({"error": str(e)}, 500)
+
+class CodebookServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # 默认 5，多客户端并发时易被拒绝连接
+
+def make_server(db_path: str, host: str = "127.0.0.1", port: int = 8765, pool_size: int = 8):
+    ensure_db(db_path)
+    pool = ConnectionPool(db_path, pool_size)
+    handler = type("CodebookHandler", (Handler,), {"index": CodebookIndex(db_path, pool)})
+    return CodebookServer((host, port), handler)
+
+# ---------------- 客户端 ----------------
+def remote_query(base_url: str, table: str, keyword: str, limit: int = 1000, filters: dict = None, timeout: float = 5):
+    params = {"table": table, "kw": keyword, "limit": limit}
+    params.update({k: v for k, v in (filters or {}).items() if (v or "").strip()})
+    with urlopen(f"{base_url}/query?{urlencode(params)}", timeout=timeout) as r:
+        return json.loads(r.read())["rows"]
+
+def remote_page(base_url: str, table: str, keyword: str = "", after=None, page_size: int = 500,
+                filters: dict = None, timeout: float = 5):
+    params = {"table": table, "kw": keyword, "size": page_size}
+    params.update({k: v for k, v in (filters or {}).items() if (v or "").strip()})
+    if after:
+        params.update(after_name=after[0], after_code=after[1])
+    with urlopen(f"{base_url}/page?{urlencode(params)}", timeout=timeout) as r:
+        obj = json.loads(r.read())
+    return [tuple(x) for x in obj["rows"]], (tuple(obj["next"]) if obj["next"] else None)
+
+def remote_count(base_url: str, table: str, keyword: str = "", filters: dict = None, timeout: float = 5):
+    params = {"table": table, "kw": keyword}
+    params.update({k: v for k, v in (filters or {}).items() if (v or "").strip()})
+    with urlopen(f"{base_url}/count?{urlencode(params)}", timeout=timeout) as r:
+        obj = json.loads(r.read())
+    return obj["count"], obj["exact"]
+
+def remote_lookup(base_url: str, table: str, codes, timeout: float = 5):
+    req = Request(f"{base_url}/batch", data=json.dumps({"table": table, "codes": list(codes)}).encode("utf-8"),
+                  headers={"Content-Type": "application/json"})
+    with urlopen(req, timeout=timeout) as r:
+        return json.loads(r.read())["rows"]
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="行号库本地查询服务")
+    ap.add_argument("--db", default=str(Path(__file__).parent / "codebook.db"))
+    ap.add_argument("--host", default="127.0.0.1", help="局域网共享时用 0.0.0.0")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--pool", type=int, default=8, help="只读连接池大小")
+    args = ap.parse_args()
+    srv = make_server(args.db, args.host, args.port, args.pool)
+    print(f"serving {args.db} on http://{args.host}:{args.port}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -3,27 +3,155 @@ import sqlite3
 from pathlib import Path
 from typing import Iterable, List, Tuple
 
-def ensure_db(db_path: str):
-    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    cur.execute("""CREATE TABLE IF NOT EXISTS ibps (
-        code TEXT PRIMARY KEY,
-        name TEXT,
+SCHEMA_VERSION = 1
+# 各库的结构化列（code 在前）；导入行格式为 (*TABLE_COLS[table], raw_line, source)
+TABLE_COLS = {"ibps": ["code", "name"], "cnaps": ["code", "name", "clscode", "citycode"]}
+
+def _table_sql(table: str, name: str = None):
+    extra = "".join(f"\n        {c} TEXT NOT NULL DEFAULT ''," for c in TABLE_COLS[table][2:])
+    return f"""CREATE TABLE IF NOT EXISTS {name or table} (
+        code TEXT PRIMARY KEY NOT NULL,
+        name TEXT NOT NULL DEFAULT '',{extra}
         raw_line TEXT,
         source TEXT,
         updated_at TEXT DEFAULT (datetime('now'))
-    )""")
-    cur.execute("""CREATE TABLE IF NOT EXISTS cnaps (
-        code TEXT PRIMARY KEY,
-        name TEXT,
+    ) WITHOUT ROWID"""
+
+def _history_sql(table: str, name: str = None):
+    # 每次导入记为一个版本，{table}_history 只保存该版本新增/变更/删除的 code
+    extra = "".join(f"\n        {c} TEXT," for c in TABLE_COLS[table][2:])
+    return f"""CREATE TABLE IF NOT EXISTS {name or table + '_history'} (
+        code TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        name TEXT,{extra}
         raw_line TEXT,
+        deleted INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (code, version)
+    ) WITHOUT ROWID"""
+
+def _compact_raw(table: str, vals, raw):
+    # raw_line 能由结构化列原样拼回时不再保存，只保留确有额外信息的原始行
+    if raw is None:
+        return None
+    vals = ["" if v is None else str(v) for v in vals]
+    if table == "cnaps":
+        code, name, cls, city = vals
+        rebuilt = "|".join([code, cls, city, name])
+    else:
+        rebuilt = "|".join(vals)
+    return None if raw == rebuilt else raw
+
+def _split_raw(table: str, code, name, raw):
+    # 旧库 cnaps 的 CLSCODE/CITYCODE 只存在于 raw_line（BNKCODE|CLSCODE|CITYCODE|LNAME）
+    extra = []
+    if table == "cnaps":
+        parts = (raw or "").split("|")
+        extra = [parts[1], parts[2]] if len(parts) >= 4 and parts[0] == code else ["", ""]
+        if any(x in ("nan", "None") for x in extra):
+            # 旧版对空值 str() 后写入了 "nan"/"None"：按空串处理，原始行同步改写后再压缩
+            extra = ["" if x in ("nan", "None") else x for x in extra]
+            raw = "|".join([parts[0], *extra, *parts[3:]])
+    vals = [code, name] + extra
+    return vals, _compact_raw(table, vals, raw)
+
+def _table_exists(cur, name: str):
+    return cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone() is not None
+
+def _migrate_v1(cur):
+    # v0 -> v1：rowid 表改为 WITHOUT ROWID，cnaps 拆出 clscode/citycode，冗余 raw_line 置空
+    cur.execute("BEGIN")
+    for table, cols in TABLE_COLS.items():
+        if _table_exists(cur, table):
+            cur.execute(f"ALTER TABLE {table} RENAME TO {table}__v0")
+            cur.execute(_table_sql(table))
+            rows = []
+            for code, name, raw, source, updated_at in cur.execute(
+                    f"SELECT code, name, raw_line, source, updated_at FROM {table}__v0 WHERE code IS NOT NULL").fetchall():
+                vals, raw = _split_raw(table, code, name or "", raw)
+                rows.append((*vals, raw, source, updated_at))
+            ph = ",".join("?" * (len(cols) + 3))
+            cur.executemany(f"INSERT OR REPLACE INTO {table}({','.join(cols)}, raw_line, source, updated_at) VALUES ({ph})", rows)
+            cur.execute(f"DROP TABLE {table}__v0")
+        hist = f"{table}_history"
+        if _table_exists(cur, hist):
+            cur.execute(f"ALTER TABLE {hist} RENAME TO {hist}__v0")
+            cur.execute(_history_sql(table))
+            rows = []
+            for code, version, name, raw, deleted in cur.execute(
+                    f"SELECT code, version, name, raw_line, deleted FROM {hist}__v0").fetchall():
+                if deleted:
+                    rows.append((code, version, name) + (None,) * (len(cols) - 2) + (raw, deleted))
+                    continue
+                vals, raw = _split_raw(table, code, name or "", raw)
+                rows.append((vals[0], version, *vals[1:], raw, deleted))
+            ph = ",".join("?" * (len(cols) + 3))
+            cur.executemany(f"INSERT INTO {hist}(code, version, {','.join(cols[1:])}, raw_line, deleted) VALUES ({ph})", rows)
+            cur.execute(f"DROP TABLE {hist}__v0")
+
+def ensure_db(db_path: str):
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    cur = conn.cursor()
+    ver = cur.execute("PRAGMA user_version").fetchone()[0]
+    migrated = False
+    if ver < 1 and (_table_exists(cur, "ibps") or _table_exists(cur, "cnaps")):
+        _migrate_v1(cur); migrated = True
+    cur.execute("""CREATE TABLE IF NOT EXISTS codebook_versions (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        tbl TEXT NOT NULL,
+        mode TEXT,
         source TEXT,
-        updated_at TEXT DEFAULT (datetime('now'))
+        added INTEGER DEFAULT 0,
+        changed INTEGER DEFAULT 0,
+        removed INTEGER DEFAULT 0,
+        created_at TEXT DEFAULT (datetime('now'))
     )""")
-    conn.commit(); conn.close()
+    # 监视文件夹的文件索引：大小/mtime 未变即跳过，内容哈希用于识别已导入过的同内容文件
+    cur.execute("""CREATE TABLE IF NOT EXISTS watch_files (
+        folder TEXT NOT NULL,
+        name TEXT NOT NULL,
+        size INTEGER,
+        mtime_ns INTEGER,
+        digest TEXT,
+        tbl TEXT,
+        version INTEGER,
+        status TEXT,
+        message TEXT,
+        seen_at TEXT DEFAULT (datetime('now')),
+        PRIMARY KEY (folder, name)
+    ) WITHOUT ROWID""")
+    cur.execute("CREATE INDEX IF NOT EXISTS watch_files_digest ON watch_files(digest)")
+    for table in TABLE_COLS:
+        cur.execute(_table_sql(table))
+        cur.execute(_history_sql(table))
+        # WITHOUT ROWID 表的二级索引自带主键 code，(name) 即可覆盖 SELECT code, name ... ORDER BY name
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_name ON {table}(name)")
+        for col in TABLE_COLS[table][2:]:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_{col}_name ON {table}({col}, name)")
+        _baseline_if_needed(cur, table)
+    cur.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+    conn.commit()
+    if migrated:
+        conn.execute("VACUUM")
+    conn.close()
+
+def _baseline_if_needed(cur, table: str):
+    # 旧库首次启用版本记录：把现有内容整体记为一个 baseline 版本（仅此一次全量）
+    if cur.execute("SELECT 1 FROM codebook_versions WHERE tbl=? LIMIT 1", (table,)).fetchone():
+        return
+    n = cur.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    if not n:
+        return
+    cur.execute("INSERT INTO codebook_versions(tbl, mode, added) VALUES (?, 'baseline', ?)", (table, n))
+    v = cur.lastrowid
+    cols = ",".join(TABLE_COLS[table][1:])
+    cur.execute(f"""INSERT INTO {table}_history(code, version, {cols}, raw_line, deleted)
+                    SELECT code, ?, {cols}, raw_line, 0 FROM {table}""", (v,))
 
-def upsert_many_batched(db_path: str, table: str, rows: Iterable[Tuple[str,str,str,str]], batch_size: int = 20000):
+def import_rows(db_path: str, table: str, rows: Iterable[Tuple[str, ...]], *,
+                replace: bool = False, source: str = None, batch_size: int = 20000):
+    cols = TABLE_COLS[table]; n = len(cols)
+    val_cols = cols[1:] + ["raw_line"]
     conn = sqlite3.connect(db_path)
     try:
         conn.execute("PRAGMA journal_mode=WAL;")
@@ -31,42 +159,195 @@ def upsert_many_batched(db_path: str, table: str, rows: Iterable[Tuple[str,str,s
     except Exception:
         pass
     cur = conn.cursor()
-    sql = f"""INSERT INTO {table}(code, name, raw_line, source)
-              VALUES (?,?,?,?)
-              ON CONFLICT(code) DO UPDATE SET
-                name=excluded.name,
-                raw_line=excluded.raw_line,
-                source=excluded.source,
-                updated_at=datetime('now')"""
+    stage = f"_incoming_{table}"
+    cur.execute(f"""CREATE TEMP TABLE IF NOT EXISTS {stage} (
+        code TEXT PRIMARY KEY, {', '.join(c + ' TEXT' for c in cols[1:])}, raw_line TEXT, source TEXT)""")
+    cur.execute(f"DELETE FROM {stage}")
+    ins = f"INSERT OR REPLACE INTO {stage} VALUES ({','.join('?' * (n + 2))})"
     batch = []
     count = 0
     for r in rows:
-        batch.append(r)
+        vals = list(r[:n])
+        batch.append((*vals, _compact_raw(table, vals, r[n]), r[n + 1]))
         if len(batch) >= batch_size:
-            cur.executemany(sql, batch)
-            conn.commit()
+            cur.executemany(ins, batch)
             count += len(batch)
             batch.clear()
     if batch:
-        cur.executemany(sql, batch)
-        conn.commit()
+        cur.executemany(ins, batch)
         count += len(batch)
+    cur.execute("INSERT INTO codebook_versions(tbl, mode, source) VALUES (?,?,?)",
+                (table, "replace" if replace else "upsert", source))
+    v = cur.lastrowid
+    hcols = ", ".join(val_cols)
+    icols = ", ".join("i." + c for c in val_cols)
+    cur.execute(f"""INSERT INTO {table}_history(code, version, {hcols}, deleted)
+                    SELECT i.code, ?, {icols}, 0 FROM {stage} i
+                    WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.code = i.code)""", (v,))
+    added = cur.rowcount
+    diff = " OR ".join(f"t.{c} IS NOT i.{c}" for c in val_cols)
+    cur.execute(f"""INSERT INTO {table}_history(code, version, {hcols}, deleted)
+                    SELECT i.code, ?, {icols}, 0 FROM {stage} i JOIN {table} t ON t.code = i.code
+                    WHERE {diff}""", (v,))
+    changed = cur.rowcount
+    removed = 0
+    if replace:
+        cur.execute(f"""INSERT INTO {table}_history(code, version, deleted)
+                        SELECT t.code, ?, 1 FROM {table} t
+                        WHERE NOT EXISTS (SELECT 1 FROM {stage} i WHERE i.code = t.code)""", (v,))
+        removed = cur.rowcount
+        cur.execute(f"DELETE FROM {table} WHERE code NOT IN (SELECT code FROM {stage})")
+    sets = ",\n                      ".join(f"{c}=excluded.{c}" for c in val_cols + ["source"])
+    cur.execute(f"""INSERT INTO {table}({', '.join(cols)}, raw_line, source)
+                    SELECT {', '.join(cols)}, raw_line, source FROM {stage} WHERE true
+                    ON CONFLICT(code) DO UPDATE SET
+                      {sets},
+                      updated_at=datetime('now')""")
+    cur.execute("UPDATE codebook_versions SET added=?, changed=?, removed=? WHERE version=?",
+                (added, changed, removed, v))
+    cur.execute(f"DELETE FROM {stage}")
+    conn.commit(); conn.close()
+    return {"version": v, "count": count, "added": added, "changed": changed, "removed": removed}
+
+def upsert_many_batched(db_path: str, table: str, rows: Iterable[Tuple[str, ...]], batch_size: int = 20000):
+    return import_rows(db_path, table, rows, batch_size=batch_size)["count"]
+
+def replace_all(db_path: str, table: str, rows: List[Tuple[str, ...]]):
+    return import_rows(db_path, table, rows, replace=True)
+
+def _prefix_range(prefix: str):
+    # 前缀 p 等价于 [p, p 的末字符 +1)，可直接走 (col, name) 复合索引做范围扫描
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def _filter_sql(table: str, filters, alias: str = ""):
+    clauses, params = [], []
+    for col, val in (filters or {}).items():
+        val = (val or "").strip()
+        if not val:
+            continue
+        if col not in TABLE_COLS[table][2:]:
+            raise ValueError(f"{table} 不支持按 {col} 过滤")
+        lo, hi = _prefix_range(val)
+        clauses.append(f"{alias}{col} >= ? AND {alias}{col} < ?"); params += [lo, hi]
+    return "".join(f" AND {c}" for c in clauses), params
+
+def query(db_path: str, table: str, keyword: str, limit: int = 1000, filters: dict = None, conn=None):
+    # conn：调用方自带的连接（如服务端连接池），用完不关闭
+    own = conn is None
+    if own:
+        conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cur = conn.cursor()
+    kw = f"%{keyword}%"
+    where, params = _filter_sql(table, filters)
+    cur.execute(f"""SELECT {', '.join(TABLE_COLS[table])} FROM {table}
+                    WHERE (code LIKE ? OR name LIKE ?){where}
+                    ORDER BY name LIMIT ?""", (kw, kw, *params, limit))
+    rows = [dict(r) for r in cur.fetchall()]
+    if own:
+        conn.close()
+    return rows
+
+def query_page(db_path: str, table: str, keyword: str = "", after=None, page_size: int = 500,
+               filters: dict = None, conn=None):
+    # 按 (name, code) 做 keyset 分页：after 为上一页返回的 next，每页代价与翻到第几页无关
+    own = conn is None
+    if own:
+        conn = sqlite3.connect(db_path)
+    where, params = _filter_sql(table, filters)
+    if keyword:
+        kw = f"%{keyword}%"
+        where += " AND (code LIKE ? OR name LIKE ?)"; params += [kw, kw]
+    if after:
+        where += " AND (name, code) > (?, ?)"; params += list(after)
+    cur = conn.execute(f"""SELECT {', '.join(TABLE_COLS[table])} FROM {table}
+                           WHERE 1{where} ORDER BY name, code LIMIT ?""", (*params, page_size + 1))
+    rows = [tuple(r) for r in cur.fetchall()]
+    if own:
+        conn.close()
+    nxt = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        nxt = (rows[-1][1], rows[-1][0])
+    return rows, nxt
+
+def count_rows(db_path: str, table: str, keyword: str = "", filters: dict = None, cap: int = 100000, conn=None):
+    # 返回 (条数, 是否精确)；有关键词时最多数到 cap 条，超出即视为估计值
+    own = conn is None
+    if own:
+        conn = sqlite3.connect(db_path)
+    where, params = _filter_sql(table, filters)
+    if keyword:
+        kw = f"%{keyword}%"
+        where += " AND (code LIKE ? OR name LIKE ?)"; params += [kw, kw]
+    if where:
+        n = conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE 1{where} LIMIT ?)",
+                         (*params, cap)).fetchone()[0]
+        exact = n < cap
+    else:
+        n = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]; exact = True
+    if own:
+        conn.close()
+    return n, exact
+
+def list_versions(db_path: str, table: str):
+    conn = sqlite3.connect(db_path); conn.row_factory = sqlite3.Row
+    rows = [dict(r) for r in conn.execute(
+        """SELECT version, mode, source, added, changed, removed, created_at
+           FROM codebook_versions WHERE tbl=? ORDER BY version DESC""", (table,))]
     conn.close()
-    return count
+    return rows
 
-def replace_all(db_path: str, table: str, rows: List[Tuple[str,str,str,str]]):
-    conn = sqlite3.connect(db_path); cur = conn.cursor()
-    cur.execute(f"DELETE FROM {table}")
-    conn.commit(); conn.close()
-    upsert_many_batched(db_path, table, rows)
+def version_at(db_path: str, table: str, when: str):
+    # 某一时刻（'YYYY-MM-DD HH:MM:SS'，UTC，与 created_at 一致）生效的版本号
+    conn = sqlite3.connect(db_path)
+    r = conn.execute("""SELECT MAX(version) FROM codebook_versions
+                        WHERE tbl=? AND created_at <= ?""", (table, when)).fetchone()
+    conn.close()
+    return r[0]
 
-def query(db_path: str, table: str, keyword: str, limit: int = 1000):
+def lookup_as_of(db_path: str, table: str, codes: Iterable[str], version: int):
+    # 走 (code, version) 主键，每个 code 一次索引定位
+    conn = sqlite3.connect(db_path)
+    out = {}
+    for code in codes:
+        r = conn.execute(f"""SELECT name, deleted FROM {table}_history
+                             WHERE code=? AND version<=? ORDER BY version DESC LIMIT 1""",
+                         (code, version)).fetchone()
+        if r and not r[1]:
+            out[code] = r[0]
+    conn.close()
+    return out
+
+def query_as_of(db_path: str, table: str, keyword: str, version: int, limit: int = 1000, filters: dict = None):
     conn = sqlite3.connect(db_path); conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
     kw = f"%{keyword}%"
-    cur.execute(f"""SELECT code, name FROM {table}
-                    WHERE code LIKE ? OR name LIKE ?
-                    ORDER BY name LIMIT ?""", (kw, kw, limit))
+    where, params = _filter_sql(table, filters, alias="h.")
+    cur = conn.execute(f"""SELECT {', '.join('h.' + c for c in TABLE_COLS[table])} FROM {table}_history h
+                           WHERE h.version = (SELECT MAX(x.version) FROM {table}_history x
+                                              WHERE x.code = h.code AND x.version <= ?)
+                             AND h.deleted = 0 AND (h.code LIKE ? OR h.name LIKE ?){where}
+                           ORDER BY h.name LIMIT ?""", (version, kw, kw, *params, limit))
     rows = [dict(r) for r in cur.fetchall()]
     conn.close()
     return rows
+
+# ---------------- 监视文件夹索引 ----------------
+def watch_index(db_path: str, folder: str):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT name, size, mtime_ns FROM watch_files WHERE folder=?", (folder,)).fetchall()
+    conn.close()
+    return {name: (size, mtime_ns) for name, size, mtime_ns in rows}
+
+def watch_applied(db_path: str, digest: str):
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT name FROM watch_files WHERE digest=? AND status='ok' LIMIT 1", (digest,)).fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def watch_record(db_path: str, folder: str, entries: Iterable[tuple]):
+    # entries: (name, size, mtime_ns, digest, tbl, version, status, message)
+    conn = sqlite3.connect(db_path)
+    conn.executemany("""INSERT OR REPLACE INTO watch_files(folder, name, size, mtime_ns, digest, tbl, version, status, message)
+                        VALUES (?,?,?,?,?,?,?,?,?)""", [(folder, *e) for e in entries])
+    conn.commit(); conn.close()
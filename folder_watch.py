@@ -0,0 +1,97 @@
+
+import os, queue, threading, time
+
+from db_helper import watch_applied, watch_index, watch_record
+from parse_cache import file_digest
+
+WATCH_EXTS = {".txt", ".dat", ".xls", ".xlsx", ".csv"}
+
+def scan_folder(folder: str, known: dict, exts=WATCH_EXTS):
+    # 只做一次 scandir：大小/mtime 与索引一致的文件直接跳过，不读内容；返回 [(name, size, mtime_ns)]
+    changed = []
+    with os.scandir(folder) as it:
+        for e in it:
+            if e.name.startswith(("~$", ".")) or os.path.splitext(e.name)[1].lower() not in exts:
+                continue
+            try:
+                if not e.is_file(): continue
+                st = e.stat()
+            except OSError:
+                continue
+            stamp = (st.st_size, st.st_mtime_ns)
+            if known.get(e.name) != stamp:
+                changed.append((e.name, *stamp))
+    changed.sort(key=lambda x: x[2])  # 按修改时间先后导入，较新的导出最后生效
+    return changed
+
+def mark_existing(db_path: str, folder: str, exts=WATCH_EXTS):
+    # 首次监视时把文件夹中已有文件记为基线（不导入、不计算哈希）
+    entries = [(name, size, mtime_ns, None, None, None, "baseline", None)
+               for name, size, mtime_ns in scan_folder(folder, watch_index(db_path, folder), exts)]
+    watch_record(db_path, folder, entries)
+    return len(entries)
+
+class FolderWatcher:
+    # 后台线程定期扫描文件夹；apply(path) -> (table, info) 在后台线程中执行，结果经 events 队列交给界面
+    def __init__(self, folder: str, db_path: str, apply, interval: float = 10.0, settle: float = 5.0):
+        self.folder = os.path.abspath(folder)
+        self.db_path = db_path
+        self.apply = apply
+        self.interval = interval
+        self.settle = settle
+        self.events = queue.Queue()
+        self._stop = threading.Event()
+        self._pending = {}
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True); self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        known = watch_index(self.db_path, self.folder)
+        while not self._stop.is_set():
+            try:
+                self.poll(known)
+            except Exception as e:
+                self.events.put(("error", None, str(e)))
+            self._stop.wait(self.interval)
+
+    def _ready(self, name, stamp):
+        # 文件可能仍在复制中：大小/mtime 连续两次扫描不变，或已超过 settle 秒未修改，才视为写完
+        if self._pending.get(name) == stamp or time.time() - stamp[1] / 1e9 >= self.settle:
+            self._pending.pop(name, None)
+            return True
+        self._pending[name] = stamp
+        return False
+
+    def poll(self, known: dict):
+        for name, size, mtime_ns in scan_folder(self.folder, known):
+            if self._stop.is_set(): break
+            if not self._ready(name, (size, mtime_ns)): continue
+            path = os.path.join(self.folder, name)
+            try:
+                digest = file_digest(path)
+            except OSError:
+                continue
+            dup = watch_applied(self.db_path, digest)
+            if dup:
+                entry = (name, size, mtime_ns, digest, None, None, "skip", f"内容与已导入的 {dup} 相同")
+                self.events.put(("skip", name, entry[-1]))
+            else:
+                try:
+                    table, info = self.apply(path)
+                    entry = (name, size, mtime_ns, digest, table, info["version"], "ok", None)
+                    self.events.put(("ok", name, (table, info)))
+                except Exception as e:
+                    # 失败也记入索引，文件再次变化前不重复尝试
+                    entry = (name, size, mtime_ns, digest, None, None, "error", str(e))
+                    self.events.put(("error", name, str(e)))
+            watch_record(self.db_path, self.folder, [entry])
+            known[name] = (size, mtime_ns)
@@ -0,0 +1,104 @@
+
+import hashlib, os, pickle, zlib
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(chunk_size)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+def _entry_path(cache_dir: str, digest: str, stage: str, version: str) -> Path:
+    return Path(cache_dir) / f"{digest}.{stage}.v{version}.bin"
+
+def _pack(df: pd.DataFrame) -> bytes:
+    # 按列存储：列名 + 每列一个 list，再整体 zlib 压缩
+    cols = list(df.columns)
+    data = [df.iloc[:, j].tolist() for j in range(len(cols))]
+    dtypes = [str(df.dtypes.iloc[j]) for j in range(len(cols))]
+    payload = pickle.dumps({"columns": cols, "dtypes": dtypes, "index": df.index.tolist(), "data": data,
+                           "attrs": dict(df.attrs)},
+                           protocol=pickle.HIGHEST_PROTOCOL)
+    return zlib.compress(payload, 1)
+
+def _unpack(blob: bytes) -> pd.DataFrame:
+    obj = pickle.loads(zlib.decompress(blob))
+    cols = obj["columns"]
+    if not cols:
+        df = pd.DataFrame(index=obj["index"])
+        df.attrs.update(obj.get("attrs") or {})
+        return df
+    df = pd.DataFrame({j: col for j, col in enumerate(obj["data"])}, index=obj["index"], dtype=object)
+    for j, dt in enumerate(obj["dtypes"]):
+        if dt != "object":
+            df[j] = df[j].astype(dt)
+    df.columns = cols
+    df.attrs.update(obj.get("attrs") or {})
+    return df
+
+def cache_get(cache_dir: str, digest: str, stage: str, version: str) -> Optional[pd.DataFrame]:
+    p = _entry_path(cache_dir, digest, stage, version)
+    try:
+        blob = p.read_bytes()
+    except OSError:
+        return None
+    try:
+        df = _unpack(blob)
+    except Exception:
+        try: p.unlink()
+        except OSError: pass
+        return None
+    try:
+        os.utime(p, None)  # 命中即刷新 mtime，作为 LRU 的访问时间
+    except OSError:
+        pass
+    return df
+
+def cache_put(cache_dir: str, digest: str, stage: str, version: str, df: pd.DataFrame,
+              max_bytes: int = CACHE_MAX_BYTES):
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    p = _entry_path(cache_dir, digest, stage, version)
+    tmp = p.with_suffix(".tmp")
+    try:
+        tmp.write_bytes(_pack(df))
+        os.replace(tmp, p)
+    except Exception:
+        try: tmp.unlink()
+        except OSError: pass
+        return
+    evict(cache_dir, max_bytes)
+
+def evict(cache_dir: str, max_bytes: int = CACHE_MAX_BYTES):
+    entries = []
+    total = 0
+    for p in Path(cache_dir).glob("*.bin"):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+        total += st.st_size
+    if total <= max_bytes:
+        return
+    entries.sort()
+    for _, size, p in entries:
+        if total <= max_bytes:
+            break
+        try:
+            p.unlink(); total -= size
+        except OSError:
+            pass
+
+def clear(cache_dir: str):
+    for p in Path(cache_dir).glob("*.bin"):
+        try: p.unlink()
+        except OSError: pass